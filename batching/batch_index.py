@@ -0,0 +1,224 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, Union
+
+# Internal imports
+from config import BATCH_COMPLETION_WINDOW_HOURS
+
+# A request goes through pending (sent in a batch), retrieved (its batch output is
+# in BATCH_OUTPUT_FOLDER) and done (structured document written), or failed. A request
+# still pending after the completion window of its batch is considered lost. A
+# retrieved request is not current: its answer may be invalid, which is only known
+# once the post-processing marks it done or failed
+PENDING = "pending"
+RETRIEVED = "retrieved"
+DONE = "done"
+FAILED = "failed"
+CURRENT = (PENDING, DONE)
+
+
+class BatchIndex:
+    """
+    Persistent index of the documents sent to the batch API: custom_id -> hash of the
+    raw text and prompt version it was sent with -> location of its result. A document
+    whose raw text and prompt did not change since it was sent needs no new request.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        pending_hours: float = BATCH_COMPLETION_WINDOW_HOURS,
+    ):
+        """
+        Open (or create) the index.
+        :param path: Location of the SQLite file
+        :param pending_hours: Hours after which a pending request is sent again
+        """
+        self.pending_expiry = timedelta(hours=pending_hours)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS requests (
+                custom_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                prompt_version TEXT NOT NULL,
+                status TEXT NOT NULL,
+                batch_id TEXT,
+                location TEXT,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS requests_batch ON requests (batch_id)"
+        )
+        self._conn.commit()
+
+    def get(self, custom_id: str) -> Optional[dict]:
+        """
+        :return: The index entry of a document, or None if it was never sent
+        """
+        keys = (
+            "content_hash",
+            "etag",
+            "prompt_version",
+            "status",
+            "batch_id",
+            "location",
+            "updated_at",
+        )
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(keys)} FROM requests WHERE custom_id = ?",
+                (custom_id,),
+            ).fetchone()
+        return None if row is None else dict(zip(keys, row))
+
+    def is_current(
+        self,
+        custom_id: str,
+        prompt_version: str,
+        content_hash: Optional[str] = None,
+        etag: Optional[str] = None,
+    ) -> bool:
+        """
+        Whether the result of a document, sent or stored, is still valid.
+        :param content_hash: Hash of the raw text
+        :param etag: ETag of the raw text, lets a listing decide without downloading it
+        :return: True if the document was sent with the same prompt version and the
+                 same raw text, and did not fail nor stay pending too long
+        """
+        entry = self.get(custom_id)
+        if entry is None or entry["status"] not in CURRENT:
+            return False
+        if entry["status"] == PENDING and self._expired(entry["updated_at"]):
+            return False
+        if entry["prompt_version"] != prompt_version:
+            return False
+        return (content_hash is not None and content_hash == entry["content_hash"]) or (
+            etag is not None and etag == entry["etag"]
+        )
+
+    def _expired(self, updated_at: str) -> bool:
+        # The batch of a pending request was never retrieved within its window
+        return datetime.now() - datetime.fromisoformat(updated_at) > self.pending_expiry
+
+    def update_etag(self, custom_id: str, etag: Optional[str]) -> None:
+        # The raw text was uploaded again with the same content
+        self._execute(
+            "UPDATE requests SET etag = ? WHERE custom_id = ?", etag, custom_id
+        )
+
+    def record_pending(
+        self,
+        entries: Iterable[Tuple[str, str, Optional[str]]],
+        prompt_version: str,
+        batch_id: str,
+    ) -> None:
+        """
+        :param entries: (custom_id, content_hash, etag) of the requests of a batch
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO requests
+                    (custom_id, content_hash, etag, prompt_version, status, batch_id,
+                     location, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, NULL, ?)
+                ON CONFLICT (custom_id) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    etag = excluded.etag,
+                    prompt_version = excluded.prompt_version,
+                    status = excluded.status,
+                    batch_id = excluded.batch_id,
+                    location = NULL,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (
+                        custom_id,
+                        content_hash,
+                        etag,
+                        prompt_version,
+                        PENDING,
+                        batch_id,
+                        now,
+                    )
+                    for custom_id, content_hash, etag in entries
+                ],
+            )
+            self._conn.commit()
+
+    def record_retrieved(self, batch_id: str, location: str) -> None:
+        # Output file of a finished batch, the results of its pending requests
+        self._execute(
+            "UPDATE requests SET status = ?, location = ?, updated_at = ? "
+            "WHERE batch_id = ? AND status = ?",
+            RETRIEVED,
+            location,
+            datetime.now().isoformat(),
+            batch_id,
+            PENDING,
+        )
+
+    def release_batch(self, batch_id: str) -> None:
+        # Batch failed, expired or cancelled: its pending requests have to be sent again
+        self._execute(
+            "UPDATE requests SET status = ?, updated_at = ? "
+            "WHERE batch_id = ? AND status = ?",
+            FAILED,
+            datetime.now().isoformat(),
+            batch_id,
+            PENDING,
+        )
+
+    def record_done(self, results: Iterable[Tuple[str, str]]) -> None:
+        """
+        :param results: (custom_id, location of the structured document)
+        """
+        self._update_many(DONE, results)
+
+    def record_failed(self, custom_ids: Iterable[str]) -> None:
+        self._update_many(FAILED, ((custom_id, None) for custom_id in custom_ids))
+
+    def _update_many(self, status: str, rows: Iterable[Tuple[str, Optional[str]]]):
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE requests SET status = ?, "
+                "location = COALESCE(?, location), updated_at = ? WHERE custom_id = ?",
+                [(status, location, now, custom_id) for custom_id, location in rows],
+            )
+            self._conn.commit()
+
+    def _execute(self, query: str, *params) -> None:
+        with self._lock:
+            self._conn.execute(query, params)
+            self._conn.commit()
+
+    def summary(self) -> dict:
+        """
+        :return: Number of documents per status
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT status, COUNT(*) FROM requests GROUP BY status"
+            )
+            return dict(cursor.fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,231 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import asyncio
+import json
+import os
+from pathlib import Path
+from time import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional, Union
+import typer
+from loguru import logger
+
+# Internal imports
+from config import (
+    OPENAI_API_KEY,
+    BATCH_POLL_MIN_INTERVAL,
+    BATCH_POLL_MAX_INTERVAL,
+    BATCH_POLL_CONCURRENCY,
+    BATCH_HANDLE_MAX_ATTEMPTS,
+)
+from tools.metrics import metrics
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# Final status of a batch whose results could not be stored by on_terminal
+HANDLING_FAILED = "handling_failed"
+
+app = typer.Typer()
+
+
+class BatchTracker:
+    """
+    Watch many batches at once. Each batch is polled on its own schedule: the interval
+    doubles while its status and progress stay the same, and falls back to the minimum
+    as soon as they change. The state is persisted after every check, so a restarted
+    tracker resumes where it stopped and never handles a finished batch twice.
+    """
+
+    def __init__(
+        self,
+        batch_ids: Iterable[str],
+        on_terminal: Callable,
+        state_file: Union[str, Path],
+        min_interval: float = BATCH_POLL_MIN_INTERVAL,
+        max_interval: float = BATCH_POLL_MAX_INTERVAL,
+        concurrency: int = BATCH_POLL_CONCURRENCY,
+        client: Optional["AsyncOpenAI"] = None,
+        max_attempts: int = BATCH_HANDLE_MAX_ATTEMPTS,
+    ):
+        """
+        :param batch_ids: The batches to watch
+        :param on_terminal: Called in a worker thread with the batch object once it reaches
+                            a terminal status, typically to download its output and errors
+        :param state_file: JSON file where the state of the batches is persisted
+        :param min_interval: Seconds between two checks of a batch that is progressing
+        :param max_interval: Maximum seconds between two checks of a batch
+        :param concurrency: Maximum number of simultaneous API calls
+        :param client: Async OpenAI client, by default one is created from OPENAI_API_KEY
+                       for each run and closed at its end
+        :param max_attempts: Calls of on_terminal for a batch, after which the batch is
+                             given up with the status HANDLING_FAILED
+        """
+        self.batch_ids = list(batch_ids)
+        self.on_terminal = on_terminal
+        self.state_file = Path(state_file)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        self.max_attempts = max(1, max_attempts)
+        self.client = client
+        self.state: Dict[str, dict] = self._load_state()
+        self.api_calls = 0
+
+    def _load_state(self) -> Dict[str, dict]:
+        if self.state_file.exists():
+            with open(self.state_file, "r") as file:
+                return json.load(file)
+        return {}
+
+    def _save_state(self) -> None:
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_suffix(".tmp")
+        with open(tmp_file, "w") as file:
+            json.dump(self.state, file, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    async def run(self) -> Dict[str, str]:
+        """
+        Watch every batch until it is finished and handled.
+        :return: Final status of each batch
+        """
+        if self.client is None:
+            from openai import AsyncOpenAI
+
+            # Owned by this run, its connection pool is closed with it
+            async with AsyncOpenAI(api_key=OPENAI_API_KEY) as client:
+                self.client = client
+                try:
+                    return await self.run()
+                finally:
+                    self.client = None
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(
+            *(self._watch(batch_id, semaphore) for batch_id in self.batch_ids)
+        )
+        logger.info(
+            f"{len(self.batch_ids)} batches tracked with {self.api_calls} calls"
+        )
+        return {batch_id: self.state[batch_id]["status"] for batch_id in self.batch_ids}
+
+    @staticmethod
+    def _record_latency(batch_) -> None:
+        # Seconds from creation to the start of the processing, and to the end
+        created = getattr(batch_, "created_at", None)
+        if not metrics.enabled or created is None:
+            return
+        started = getattr(batch_, "in_progress_at", None)
+        ended = getattr(batch_, f"{batch_.status}_at", None)
+        queued = None if started is None else started - created
+        elapsed = None if ended is None else ended - created
+        if queued is not None:
+            metrics.observe("batch_queue_seconds", queued)
+        if elapsed is not None:
+            metrics.observe("batch_completion_seconds", elapsed, status=batch_.status)
+        metrics.event(
+            "batch",
+            f"Batch {batch_.id} {batch_.status}, queued {queued}s, total {elapsed}s",
+            level="INFO",
+            batch_id=batch_.id,
+            status=batch_.status,
+            queue_seconds=queued,
+            completion_seconds=elapsed,
+        )
+
+    async def _watch(self, batch_id: str, semaphore: asyncio.Semaphore) -> None:
+        from openai import APIError
+
+        entry = self.state.setdefault(
+            batch_id,
+            {"status": None, "progress": None, "handled": False},
+        )
+        interval = self.min_interval
+        while not entry["handled"]:
+            try:
+                async with semaphore:
+                    self.api_calls += 1
+                    metrics.inc("openai_requests", operation="batches.retrieve")
+                    batch_ = await self.client.batches.retrieve(batch_id)
+            except APIError as e:
+                logger.warning(f"Status check of {batch_id} failed: {e}")
+                interval = min(interval * 2, self.max_interval)
+                await asyncio.sleep(interval)
+                continue
+
+            counts = batch_.request_counts
+            progress = None if counts is None else [counts.completed, counts.failed]
+            if batch_.status != entry["status"] or progress != entry["progress"]:
+                logger.info(f"Batch {batch_id}: {batch_.status} {progress or ''}")
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            entry.update(status=batch_.status, progress=progress, checked_at=time())
+
+            if batch_.status in TERMINAL_STATUSES:
+                try:
+                    await asyncio.to_thread(self.on_terminal, batch_)
+                    entry["handled"] = True
+                    self._record_latency(batch_)
+                except Exception as e:
+                    attempts = entry.get("attempts", 0) + 1
+                    entry["attempts"] = attempts
+                    logger.error(
+                        f"Handling of finished batch {batch_id} failed "
+                        f"({attempts}/{self.max_attempts}): {e}"
+                    )
+                    if attempts >= self.max_attempts:
+                        # Given up, a restarted tracker does not try it again
+                        entry.update(status=HANDLING_FAILED, handled=True, error=str(e))
+            self._save_state()
+            if not entry["handled"]:
+                await asyncio.sleep(interval)
+
+
+def tracker_file(group_file: Union[str, Path]) -> Path:
+    # State of the BatchTracker of a group, as written by BatchManager.retrieve_results
+    group_file = Path(group_file)
+    return group_file.with_name(f"{group_file.stem}-tracker.json")
+
+
+async def _retrieve_statuses(batch_ids: Iterable[str]) -> Dict[str, str]:
+    from openai import AsyncOpenAI
+
+    async with AsyncOpenAI(api_key=OPENAI_API_KEY) as client:
+        batches = await asyncio.gather(*(client.batches.retrieve(b) for b in batch_ids))
+    return {batch_.id: batch_.status for batch_ in batches}
+
+
+def batch_status(group_file: Union[str, Path], refresh: bool = False) -> Dict[str, str]:
+    """
+    Status of every batch of a group.
+    :param group_file: A batch group manifest written by BatchManager.send_batch_request
+    :param refresh: Ask the OpenAI API, instead of the last state of the tracker
+    :return: Status by batch ID, "unknown" when the tracker never checked the batch
+    """
+    with open(group_file, "r") as file:
+        batch_ids = [batch_["batch_id"] for batch_ in json.load(file)["batches"]]
+    if refresh:
+        return asyncio.run(_retrieve_statuses(batch_ids))
+    state_file = tracker_file(group_file)
+    state = json.loads(state_file.read_text()) if state_file.exists() else {}
+    return {
+        batch_id: state.get(batch_id, {}).get("status") or "unknown"
+        for batch_id in batch_ids
+    }
+
+
+@app.command()
+def main(
+    group_file: Path,
+    refresh: bool = typer.Option(False, help="Ask the OpenAI API for the status"),
+):
+    for batch_id, status in batch_status(group_file, refresh).items():
+        print(f"{batch_id}\t{status}")
+
+
+if __name__ == "__main__":
+    app()
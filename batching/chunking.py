@@ -0,0 +1,141 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import re
+from typing import List, Optional, Tuple
+
+# custom_id of the part of a document sent in several requests: FR/123.txt#2-5
+PART_ID = re.compile(r"^(?P<custom_id>.+)#(?P<part>\d+)-(?P<parts>\d+)$")
+HEADING_MAX_CHARS = 120
+# A heading is a short line that does not end like a sentence or a list item
+SENTENCE_END = tuple(".,;:!?…")
+
+
+def part_id(custom_id: str, part: int, parts: int) -> str:
+    return f"{custom_id}#{part}-{parts}"
+
+
+def parse_part_id(custom_id: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """
+    :return: The custom_id of the document, the number of the part (from 1) and the
+             number of parts, or (custom_id, None, None) for a document sent whole
+    """
+    match = PART_ID.match(custom_id or "")
+    if match is None:
+        return custom_id, None, None
+    return match["custom_id"], int(match["part"]), int(match["parts"])
+
+
+def is_heading(line: str, max_chars: int = HEADING_MAX_CHARS) -> bool:
+    # Raw texts carry no styles, a heading is recognized from its shape
+    line = line.strip()
+    return (
+        0 < len(line) <= max_chars
+        and not line.endswith(SENTENCE_END)
+        and (line[0].isupper() or line[0].isdigit())
+    )
+
+
+def _sections(text: str) -> List[Tuple[Optional[str], List[str]]]:
+    # (heading, lines) of each section, the lines before the first heading have none
+    sections = [(None, [])]
+    for line in text.split("\n"):
+        if is_heading(line):
+            sections.append((line, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [section for section in sections if section[1]]
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    # A paragraph longer than a part is cut at the last space that fits
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        cut = cut if cut > 0 else max_chars
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip(" ")
+    return pieces + [text]
+
+
+def split_document(text: str, max_chars: int) -> List[str]:
+    """
+    Split a text too long for one request in parts of at most max_chars characters,
+    at the headings when possible. Consecutive sections are packed in the same part,
+    a section larger than a part is split between its paragraphs, and each of its
+    pieces starts with the heading of the section, so that the answers can be merged
+    back by merge_parts.
+    :param text: Raw text of a document, one paragraph per line
+    :param max_chars: Size of a part
+    :return: The parts, in order, [text] when the text fits in one request
+    """
+    if len(text) <= max_chars:
+        return [text]
+    parts, current = [], []
+    size = 0
+
+    def add(line: str) -> None:
+        nonlocal size
+        current.append(line)
+        size += len(line) + 1
+
+    def flush() -> None:
+        nonlocal current, size
+        if current:
+            parts.append("\n".join(current))
+        current, size = [], 0
+
+    for heading, lines in _sections(text):
+        section_size = sum(len(line) + 1 for line in lines)
+        if section_size <= max_chars:
+            if size + section_size > max_chars:
+                flush()
+            for line in lines:
+                add(line)
+            continue
+        # Oversized section: its paragraphs are spread over several parts
+        prefix = [] if heading is None else [heading]
+        prefix_size = sum(len(line) + 1 for line in prefix)
+        room = max_chars - prefix_size
+        if size + prefix_size > max_chars:
+            flush()
+        for line in prefix:
+            add(line)
+        for line in lines[len(prefix) :]:
+            for piece in _split_long(line, max(room - 1, 1)):
+                if size + len(piece) + 1 > max_chars:
+                    flush()
+                    for line_ in prefix:
+                        add(line_)
+                add(piece)
+    flush()
+    return parts
+
+
+def _same_heading(previous: dict, section: dict) -> bool:
+    return (previous["h_title"].strip(), previous["level"]) == (
+        section["h_title"].strip(),
+        section["level"],
+    )
+
+
+def merge_parts(parts: List[List[dict]]) -> List[dict]:
+    """
+    Sections of a document from the sections of its parts, in order. A part that
+    starts with the section ending the previous part (the heading repeated by
+    split_document) continues it. Every section gets the main title of the first part.
+    """
+    merged: List[dict] = []
+    for sections in parts:
+        for idx, section in enumerate(sections):
+            if idx == 0 and merged and _same_heading(merged[-1], section):
+                merged[-1]["content"] = merged[-1]["content"] + section["content"]
+            else:
+                merged.append(dict(section))
+    if merged:
+        main_title = merged[0]["main_title"]
+        for section in merged:
+            section["main_title"] = main_title
+    return merged
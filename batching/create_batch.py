@@ -2,10 +2,16 @@
 Created by Analitika at 03/09/2024
 contact@analitika.fr
 """
+import asyncio
+import hashlib
 import json
 import os
-from time import sleep
-from openai import OpenAI
+import tempfile
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Dict, List, Optional
+from botocore.exceptions import ClientError
 from loguru import logger
 from datetime import datetime
 
@@ -14,160 +20,612 @@ from config import (
     DATA_DIR,
     COMPLETIONS_MODEL,
     RAW_DATA_FOLDER,
+    STRUCTURED_DATA_FOLDER,
     BATCH_OUTPUT_FOLDER,
     OPENAI_API_KEY,
+    S3_FETCH_WORKERS,
+    S3_FETCH_RETRIES,
+    S3_USE_MANIFEST,
+    BATCH_MAX_REQUESTS,
+    BATCH_MAX_BYTES,
+    BATCH_SUBMIT_WORKERS,
+    BATCH_JSON_ENCODER,
+    BATCH_MAX_PROMPT_TOKENS,
+    PROMPT_TEMPLATE,
+    BATCH_INCREMENTAL,
+    BATCH_INDEX_PATH,
+    BATCH_DEDUP,
+    BATCH_POLL_MIN_INTERVAL,
+    BATCH_POLL_MAX_INTERVAL,
+    BATCH_COMPLETION_WINDOW_HOURS,
+    S3_STREAM_CHUNK_SIZE,
 )
-from tools import S3Manager
+from tools import S3Manager, S3ManifestIndex
+from tools.resources import format_bytes, peak_memory_bytes
+from tools.metrics import metrics
+from batching.batch_index import BatchIndex
+from batching.batch_tracker import HANDLING_FAILED, BatchTracker
+from batching.chunking import part_id, split_document
+from batching.jsonl_writer import ShardedJsonlWriter
+from batching.post_process import structured_name
+from batching.prompts import (
+    CHARS_PER_TOKEN,
+    PromptSizeReport,
+    PromptTemplate,
+    get_template,
+)
+from batching.realtime import (
+    BATCH,
+    REALTIME,
+    RealtimeRunner,
+    choose_mode,
+    estimate_tokens,
+)
+
+
+# Any change of the prompt or of the model makes the previous results stale
+PROMPT = get_template(PROMPT_TEMPLATE)
+PROMPT_VERSION = PROMPT.version(COMPLETIONS_MODEL)
+
+
+def normalized_hash(text: str) -> bytes:
+    """
+    Hash of a text that ignores Unicode composition and whitespace differences, the
+    key under which identical documents are sent once.
+    """
+    text = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(text.encode("utf-8")).digest()
 
 
 class BatchManager:
-    json_file = None
-    batch_id = None
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    _client = None
+    # Client of the BatchTracker and of the real-time mode, from OPENAI_API_KEY when None
+    async_client = None
+
+    @property
+    def client(self):
+        # Shared by every manager, openai is only imported once a batch API is called
+        if self._client is None:
+            from openai import OpenAI
+
+            BatchManager._client = OpenAI(api_key=OPENAI_API_KEY)
+        return self._client
 
-    def __init__(self, batch_name: str):
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def __init__(
+        self,
+        batch_name: str,
+        use_manifest: bool = S3_USE_MANIFEST,
+        incremental: bool = BATCH_INCREMENTAL,
+        prompt_version: Optional[str] = None,
+        prompt: PromptTemplate = PROMPT,
+    ):
+        """
+        :param batch_name: Description of the batches
+        :param use_manifest: List raw_content through the local S3ManifestIndex
+        :param incremental: Only send the new or changed documents, see BatchIndex
+        :param prompt_version: Version of the prompt recorded in the index, the version
+                               of the template by default
+        :param prompt: Template of the requests, see batching/prompts.py
+        """
         self.bucket = S3Manager()
-        self.files = self.bucket.get_available_files(RAW_DATA_FOLDER)
+        self.json_files: List[str] = []
+        self.batch_id = None
+        self.batch_ids: List[str] = []
+        self.failed_shards: List[str] = []
+        self.group_file = None
+        self.index = BatchIndex(BATCH_INDEX_PATH) if incremental else None
+        self.prompt = prompt
+        self.prompt_version = prompt_version or prompt.version(COMPLETIONS_MODEL)
+        # (custom_id, content_hash, etag) of the requests of each shard
+        self.pending: Dict[str, list] = {}
+        self.skipped = 0
+        # Size of the job, to choose between batch and real time
+        self.n_requests = 0
+        self.prompt_chars = 0
+        # Documents answered by the request of another one with the same text
+        self.aliases: Dict[str, List[str]] = {}
+        # ETags from the listing let the S3 disk cache answer without any request
+        self.etags = {}
+        self.modified = {}
+        if use_manifest:
+            # Reuse the local listing of raw_content instead of listing it again
+            manifest = S3ManifestIndex(self.bucket, RAW_DATA_FOLDER)
+            manifest.refresh()
+            for obj in manifest.iter_objects():
+                self.etags[obj["name"]] = obj["etag"]
+                self.modified[obj["name"]] = obj["last_modified"]
+            manifest.close()
+        else:
+            try:
+                for obj in self.bucket.iter_objects(RAW_DATA_FOLDER):
+                    self.etags[obj["name"]] = obj["etag"]
+                    self.modified[obj["name"]] = obj["last_modified"]
+            except ClientError as e:
+                logger.error(str(e))
+        self.files = list(self.etags)
         self.batch_name = batch_name
 
-    def generate_json_batch(self):
-        json_data = []
-
-        for idx, file_ in enumerate(self.files):
-            content = self.bucket.download_from_s3(file_, RAW_DATA_FOLDER)
-            if content is None:
-                continue
+    @metrics.staged("generate_json_batch")
+    def generate_json_batch(
+        self,
+        max_workers: int = S3_FETCH_WORKERS,
+        retries: int = S3_FETCH_RETRIES,
+        max_requests: int = BATCH_MAX_REQUESTS,
+        max_bytes: int = BATCH_MAX_BYTES,
+        json_encoder: str = BATCH_JSON_ENCODER,
+        files: Optional[List[str]] = None,
+        shard_prefix: str = "batch_prompts",
+        skip_structured: bool = True,
+        dedup: bool = BATCH_DEDUP,
+        max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    ):
+        """
+        Build the JSONL batch input from the raw texts.
+        :param files: Subset of the raw texts to include (e.g. a retry batch), all by default
+        :param shard_prefix: Name of the JSONL shards written in DATA_DIR/raw
+        :param skip_structured: Leave out the texts already structured, see unstructured
+        :param dedup: Send one request per distinct text, see normalized_hash. The other
+                      custom_ids are recorded in aliases and get a copy of the result
+        :param max_prompt_tokens: Estimated size above which a document is split in
+                                  several requests, see split_document. 0 never splits
+        """
+        files = self.files if files is None else files
+        if skip_structured:
+            files = self.unstructured(files)
+        self.pending, self.skipped, self.aliases = {}, 0, {}
+        self.prompt_chars = 0
+        # normalized_hash -> (custom_id, shard) of the request sent for that text
+        sent_texts = {}
+        documents = split = 0
+        # Characters left for the text once the instructions are in the prompt
+        max_chars = 0
+        if max_prompt_tokens:
+            overhead = self.prompt.overhead()
+            max_chars = max(max_prompt_tokens * CHARS_PER_TOKEN - overhead, 1000)
+        report = PromptSizeReport(
+            os.path.join(DATA_DIR, "raw", f"{shard_prefix}_sizes.csv")
+        )
+        if self.index is not None:
+            # Unchanged ETag: no need to download the text to know it is the same
+            sent = [file_ for file_ in files if self._is_current(file_)]
+            self.skipped += len(sent)
+            files = sorted(set(files) - set(sent))
 
-            # Construct the prompt
-            prompt = f"""
-                ### Instructions:
-                1. Identify and structure the content according to the sections defined by headings (H1, H2, H3, H4).
-                2. For each section, create an object with the following fields:
-                   - **h_title**: The heading of the section.
-                   - **main_title**: The highest-level title for the article (typically H1).
-                   - **level**: The heading level (1 for H1, 2 for H2, etc.).
-                   - **content**: An array of content objects, where each object has:
-                     - **text**: The text content following the heading.
-                     - **url**: Set to null unless there is a URL associated with the text.
-                     - **urls**: Set to null unless there are multiple URLs associated with the text.
-                3. Group all related content under the appropriate heading levels.
-                4. Do not convert bullet points into JSON arrays; show them as text.
-                5. Ensure that all text following the headings is included in the correct "content" field.
-                6. Maintain the structure even when the text contains nested subsections.
-
-                ### Text to convert:
-
-                {content}
-                """
-
-            custom_idx = file_  # use something easy to track back to the DB
-
-            # Create the JSON object for this entry
-            json_entry = {
-                "custom_id": f"{custom_idx}",
-                "method": "POST",
-                "url": "/v1/chat/completions",
-                "body": {
-                    "model": f"{COMPLETIONS_MODEL}",  # "gpt-3.5-turbo-0125",
-                    "messages": [
-                        {"role": "system", "content": "You are a helpful assistant."},
-                        {"role": "user", "content": prompt.strip()},
-                    ],
-                    # "max_tokens": 1000,
-                    "temperature": 0,
-                    "response_format": {"type": "json_object"},
-                },
-            }
+        # Raw texts are prefetched concurrently but consumed in key order
+        contents = self.bucket.download_many(
+            sorted(files),
+            RAW_DATA_FOLDER,
+            max_workers,
+            retries,
+            etags=self.etags,
+        )
 
-            # Add the JSON object to the list
-            json_data.append(json_entry)
+        # Each request is serialized as soon as it is built, into JSONL shards that
+        # fit in a single batch each, so the corpus is never held in memory
+        with ShardedJsonlWriter(
+            os.path.join(DATA_DIR, "raw"),
+            shard_prefix,
+            max_requests,
+            max_bytes,
+            json_encoder,
+        ) as writer:
+            for file_, content in contents:
+                if content is None:
+                    continue
+                if self.index is not None:
+                    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                    etag = self.etags.get(file_)
+                    if self._is_current(file_, content_hash):
+                        # Uploaded again with the same text
+                        self.index.update_etag(file_, etag)
+                        self.skipped += 1
+                        continue
+                key = normalized_hash(content) if dedup else None
+                if key in sent_texts:
+                    canonical, shard = sent_texts[key]
+                    self.aliases.setdefault(canonical, []).append(file_)
+                else:
+                    requests = self._build_requests(file_, content, max_chars)
+                    try:
+                        # The parts of a document are sent in the same batch, so
+                        # that its index entry follows a single shard
+                        sizes = writer.write_group(requests)
+                    except ValueError as e:
+                        logger.error(f"{file_} not sent: {e}")
+                        continue
+                    split += len(requests) > 1
+                    for request, size in zip(requests, sizes):
+                        report.add(request, size)
+                    shard = str(writer.paths[-1])
+                    if dedup:
+                        sent_texts[key] = (file_, shard)
+                documents += 1
+                if self.index is not None:
+                    self.pending.setdefault(shard, []).append(
+                        (file_, content_hash, etag)
+                    )
+        report.close()
+        self.json_files = writer.paths
+        self.n_requests = writer.entries
+        self.prompt_chars = report.chars
+        if dedup and documents:
+            # Distinct texts, not requests: a text split in parts is one of them
+            distinct = len(sent_texts)
+            duplicates = documents - distinct
+            metrics.inc("documents", duplicates, stage="batch", status="duplicate")
+            logger.info(
+                f"{documents} documents, {distinct} distinct texts: "
+                f"{duplicates} duplicates answered by another request, "
+                f"dedup ratio {duplicates / documents:.1%}"
+            )
+        if split:
+            metrics.inc("documents", split, stage="batch", status="split")
+            logger.info(
+                f"{split} documents longer than {max_prompt_tokens} tokens split in "
+                f"several requests"
+            )
+        if self.index is not None:
+            metrics.inc("documents", self.skipped, stage="batch", status="skipped")
+            logger.info(
+                f"{self.skipped} documents unchanged since they were sent with prompt "
+                f"{self.prompt_version}, skipped"
+            )
+        logger.info(
+            f"{writer.entries} requests written to {len(writer.paths)} shards, "
+            f"{writer.bytes_written / 1024 ** 2:.1f} MB, "
+            f"peak memory {format_bytes(peak_memory_bytes())}"
+        )
 
-        self.json_file = os.path.join(DATA_DIR, "raw", "batch_prompts.jsonl")
-        # Write the list of JSON objects to a JSONL file
-        with open(self.json_file, "w", encoding="utf-8") as jsonl_file:
-            for entry in json_data:
-                jsonl_file.write(json.dumps(entry) + "\n")
+        report.log(self.prompt)
 
         print("JSONL Data as has been created successfully.")
+        if self.bucket.cache is not None:
+            logger.info(f"S3 cache: {self.bucket.cache.stats()}")
         return
 
-    def send_batch_request(self):
+    def _is_current(self, file_: str, content_hash: Optional[str] = None) -> bool:
+        return self.index.is_current(
+            file_, self.prompt_version, content_hash, self.etags.get(file_)
+        )
+
+    def unstructured(self, files: List[str]) -> List[str]:
+        """
+        Drop the raw texts whose structured document is newer than the text: documents
+        structured from their docx styles at ingestion (see structure_docx), or by a
+        previous batch. Pass skip_structured=False to generate_json_batch to redo them.
+        """
+        try:
+            structured = {
+                obj["name"]: obj["last_modified"]
+                for obj in self.bucket.iter_objects(STRUCTURED_DATA_FOLDER)
+            }
+        except ClientError as e:
+            logger.error(str(e))
+            return files
+
+        remaining = []
+        for file_ in files:
+            done_at = structured.get(structured_name(file_))
+            modified = self.modified.get(file_)
+            if done_at is None or modified is None or done_at < modified:
+                remaining.append(file_)
+        logger.info(
+            f"{len(files) - len(remaining)} of {len(files)} documents already "
+            f"structured, {len(remaining)} sent to the batch"
+        )
+        return remaining
+
+    def _build_requests(self, file_: str, content: str, max_chars: int) -> List[dict]:
+        # One request per part of the document, a single one when it fits
+        content = self.prompt.prepare(content)
+        parts = split_document(content, max_chars) if max_chars else [content]
+        if len(parts) == 1:
+            return [self._build_request(file_, self.prompt.messages(content))]
+        title = content.strip().split("\n", 1)[0].strip()
+        return [
+            self._build_request(
+                part_id(file_, idx, len(parts)),
+                self.prompt.messages(part, idx, len(parts), title),
+            )
+            for idx, part in enumerate(parts, start=1)
+        ]
+
+    def _build_request(self, file_: str, messages: List[dict]) -> dict:
+        custom_idx = file_  # use something easy to track back to the DB
+
+        # Create the JSON object for this entry
+        json_entry = {
+            "custom_id": f"{custom_idx}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": f"{COMPLETIONS_MODEL}",  # "gpt-3.5-turbo-0125",
+                "messages": messages,
+                # "max_tokens": 1000,
+                "temperature": 0,
+                "response_format": {"type": "json_object"},
+            },
+        }
+
+        return json_entry
+
+    @metrics.staged("send_batch_request")
+    def send_batch_request(self, max_workers: int = BATCH_SUBMIT_WORKERS):
         # 1. Check if data is present
-        if self.json_file is None:
+        if not self.json_files:
             logger.error("JSON data is empty")
             return
-        # 2. Uploading Your Batch Input File
-        # Serialize the content to a JSON string and encode it into bytes
-        batch_input_file = self.client.files.create(
-            file=open(self.json_file, "rb"), purpose="batch"
-        )
 
-        # 3. Creating the Batch task
-        batch_input_file_id = batch_input_file.id
-        batch_task = self.client.batches.create(
-            input_file_id=batch_input_file_id,
-            endpoint="/v1/chat/completions",
-            completion_window="24h",
-            metadata={"description": self.batch_name},
-        )
-        self.batch_id = batch_task.id
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        batch_id_filename = os.path.join(
-            DATA_DIR, "batch_ids", f"{current_time}-batch_id.txt"
+        # 2. Upload the shards and create their batch tasks in parallel. A failed
+        # shard does not lose the batches already created for the others
+        n_shards = len(self.json_files)
+        batches, self.failed_shards = [], []
+        with ThreadPoolExecutor(max_workers) as pool:
+            futures = {
+                pool.submit(self._submit_shard, idx, json_file, n_shards): json_file
+                for idx, json_file in enumerate(self.json_files)
+            }
+            for future in as_completed(futures):
+                json_file = futures[future]
+                try:
+                    batches.append(future.result())
+                except Exception as e:
+                    logger.error(f"Shard {os.path.basename(json_file)} not sent: {e}")
+                    self.failed_shards.append(str(json_file))
+        batches.sort(key=lambda batch: batch["shard"])
+        if self.index is not None:
+            # Sent again by the next incremental run
+            for json_file in self.failed_shards:
+                pending = self.pending.get(json_file, [])
+                self.index.record_failed(entry[0] for entry in pending)
+        if not batches:
+            logger.error(f"None of the {n_shards} shards could be sent")
+            return
+        self.batch_ids = [batch["batch_id"] for batch in batches]
+        self.batch_id = self.batch_ids[0]
+
+        # 3. Record the whole group in a single manifest
+        self._write_group(
+            "batch_group",
+            batches,
+            failed_shards=[os.path.basename(path) for path in self.failed_shards],
         )
-        with open(batch_id_filename, "w") as file:
-            file.write(self.batch_id)
 
-        logger.info(f"Batch task ID: {self.batch_id}")
+        logger.info(f"Batch task IDs: {self.batch_ids}")
+        if self.failed_shards:
+            logger.error(
+                f"{len(self.failed_shards)} of {n_shards} shards not sent, their "
+                f"documents are left for the next run"
+            )
 
         return
 
-    def retrieve_results(self, sleep_time: int = 60, batch_task_id: str = None):
-        # 4. Checking the Status of a Batch
-        if batch_task_id is not None:
-            self.batch_id = batch_task_id
+    def _write_group(self, kind: str, batches: List[dict], **fields) -> None:
+        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(os.path.join(DATA_DIR, "batch_ids"), exist_ok=True)
+        self.group_file = os.path.join(
+            DATA_DIR, "batch_ids", f"{current_time}-{kind}.json"
+        )
+        with open(self.group_file, "w") as file:
+            json.dump(
+                {
+                    "name": self.batch_name,
+                    "batches": batches,
+                    "aliases": self.aliases,
+                    **fields,
+                },
+                file,
+                indent=2,
+            )
 
-        batch_ = self.client.batches.retrieve(self.batch_id)
+    @property
+    def job_name(self) -> Optional[str]:
+        # Name of the folder of the results in BATCH_OUTPUT_FOLDER
+        if self.group_file is None:
+            return None
+        return os.path.basename(self.group_file).replace(".json", "")
 
-        while batch_manager.check_batch_status():
-            sleep(sleep_time)
+    def submit(self, deadline: Optional[float] = None, mode: str = "auto") -> str:
+        """
+        Send the shards of generate_json_batch through the batch API or in real time.
+        :param deadline: Seconds within which the results are needed
+        :param mode: BATCH, REALTIME, or "auto" to choose from the size of the job and
+                     the deadline, see choose_mode
+        :return: The mode used
+        """
+        if mode == "auto":
+            n_tokens = estimate_tokens(self.prompt_chars) if self.n_requests else 0
+            mode = choose_mode(self.n_requests, n_tokens, deadline)
+            logger.info(
+                f"{self.n_requests} requests, about {n_tokens} tokens: sent as {mode}"
+            )
+        if mode == REALTIME:
+            self.send_realtime()
+        elif mode == BATCH:
+            self.send_batch_request()
+        else:
+            raise ValueError(f"Unknown mode {mode}")
+        return mode
 
-        if batch_.status != "completed":
-            logger.info(f"Batch is not completed yet, status {batch_.status}")
+    def _iter_request_lines(self):
+        for json_file in self.json_files:
+            with open(json_file, "r", encoding="utf-8") as file:
+                yield from file
+
+    @metrics.staged("send_realtime")
+    def send_realtime(self, runner: Optional[RealtimeRunner] = None):
+        """
+        Send the requests of the shards to the chat completions endpoint right away, and
+        store the answers in BATCH_OUTPUT_FOLDER/<job> as a batch output and error file,
+        ready for the post-processing.
+        :param runner: Sends the requests, with the default rate limits by default
+        """
+        if not self.json_files:
+            logger.error("JSON data is empty")
             return
+        runner = runner or RealtimeRunner(self.async_client)
+        self._write_group(REALTIME, [], mode=REALTIME)
+        job_name = self.job_name
+        if self.index is not None:
+            entries = [entry for shard in self.pending.values() for entry in shard]
+            self.index.record_pending(entries, self.prompt_version, job_name)
 
-        # 5. Retrieving the Results
-        output_file_id = batch_.output_file_id
-        if output_file_id is None:
-            logger.error("No output available")
-            output_file_id = batch_.error_file_id
-            if output_file_id is None:
-                logger.error("No error file available, error Unknown")
-                return
+        # Answers are spooled to disk while they arrive, then streamed to S3
+        folder = f"{BATCH_OUTPUT_FOLDER}/{job_name}"
+        try:
+            with tempfile.TemporaryFile() as output, tempfile.TemporaryFile() as errors:
+                runner.send(self._iter_request_lines(), output, errors)
+                for suffix, file in (("", output), ("_errors", errors)):
+                    if not file.tell():
+                        continue
+                    file.seek(0)
+                    status = self.bucket.upload_stream_to_s3(
+                        f"{job_name}{suffix}.jsonl",
+                        iter(lambda: file.read(S3_STREAM_CHUNK_SIZE), b""),
+                        folder,
+                        content_type="text/plain",
+                    )
+                    if status:
+                        raise RuntimeError(
+                            f"Upload of {folder}/{job_name}{suffix} failed"
+                        )
+        except Exception as e:
+            logger.error(f"Real-time job {job_name} failed: {e}")
+            if self.index is not None:
+                # Nothing was stored, the documents are sent again by the next run
+                self.index.release_batch(job_name)
+            raise
+        logger.info(f"Results of {job_name} stored in {folder}")
+        if self.index is not None:
+            self.index.record_retrieved(job_name, f"{folder}/{job_name}.jsonl")
 
-        # Specify the file path where you want to save the JSON
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{current_time}_{self.batch_id}.jsonl"
+    @metrics.timed("submit_shard")
+    def _submit_shard(self, idx: int, json_file: str, n_shards: int) -> dict:
+        # Uploading the batch input file
+        metrics.observe("batch_input_bytes", os.path.getsize(json_file))
+        with open(json_file, "rb") as file:
+            batch_input_file = self.client.files.create(file=file, purpose="batch")
 
-        file_response = self.client.files.content(output_file_id)
-        json_bytes = file_response.text.encode("utf-8")
-        # Upload the JSONL file to S3 with "text/plain" content type for better browser display
-        c_type = "text/plain"  # for better browser display, not "application/x-ndjson"
-        self.bucket.upload_to_s3(
-            filename, json_bytes, BATCH_OUTPUT_FOLDER, content_type=c_type
+        # Creating the Batch task
+        description = self.batch_name
+        if n_shards > 1:
+            description = f"{self.batch_name} [{idx + 1}/{n_shards}]"
+        batch_task = self.client.batches.create(
+            input_file_id=batch_input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=f"{BATCH_COMPLETION_WINDOW_HOURS}h",
+            metadata={"description": description},
         )
-        logger.info(f"Task {self.batch_id} finished")
+        logger.info(f"Shard {os.path.basename(json_file)} sent as {batch_task.id}")
+        if self.index is not None:
+            self.index.record_pending(
+                self.pending.get(str(json_file), []), self.prompt_version, batch_task.id
+            )
+        return {
+            "shard": os.path.basename(json_file),
+            "input_file_id": batch_input_file.id,
+            "batch_id": batch_task.id,
+        }
 
-        # # Write the string directly to the file
-        # with open(file_path, "w", encoding="utf-8") as json_file:
-        #     json_file.write(output_data)
-        #
-        # print(f"Output saved to {file_path}")
+    @staticmethod
+    def load_batch_group(group_file: str) -> dict:
+        with open(group_file, "r") as file:
+            return json.load(file)
 
-        return
+    @metrics.staged("retrieve_results")
+    def retrieve_results(
+        self,
+        sleep_time: float = BATCH_POLL_MIN_INTERVAL,
+        batch_task_id: str = None,
+        group_file: str = None,
+        max_sleep_time: float = BATCH_POLL_MAX_INTERVAL,
+    ):
+        """
+        Track a batch, or every batch of a group, and store the output and error files
+        of each batch in BATCH_OUTPUT_FOLDER/<job> as soon as the batch is finished.
+        :param sleep_time: Minimum seconds between two status checks of a batch
+        :param batch_task_id: A single batch to retrieve
+        :param group_file: A batch group manifest written by send_batch_request
+        :param max_sleep_time: Maximum seconds between two status checks of a batch
+        :return: Final status of each batch
+        """
+        if batch_task_id is not None:
+            self.batch_ids = [batch_task_id]
+            job_name = batch_task_id
+        else:
+            group_file = group_file or self.group_file
+            if group_file is None:
+                logger.error("No batch to retrieve")
+                return
+            group = self.load_batch_group(group_file)
+            if group.get("mode") == REALTIME:
+                logger.info(f"{group_file} was sent in real time, nothing to retrieve")
+                return {}
+            self.batch_name = group["name"]
+            self.batch_ids = [batch["batch_id"] for batch in group["batches"]]
+            job_name = os.path.basename(group_file).replace(".json", "")
+
+        # 4. Checking the Status of the Batches, 5. Retrieving the Results
+        tracker = BatchTracker(
+            self.batch_ids,
+            partial(self._store_batch_results, f"{BATCH_OUTPUT_FOLDER}/{job_name}"),
+            os.path.join(DATA_DIR, "batch_ids", f"{job_name}-tracker.json"),
+            min_interval=sleep_time,
+            max_interval=max_sleep_time,
+            client=self.async_client,
+        )
+        statuses = asyncio.run(tracker.run())
+        logger.info(f"Task {job_name} finished: {statuses}")
+        if self.index is not None:
+            # Results never stored, their documents are sent again by the next run
+            for batch_id, status in statuses.items():
+                if status == HANDLING_FAILED:
+                    self.index.release_batch(batch_id)
+        self.bucket.compression.report()
+
+        return statuses
+
+    @metrics.timed("store_batch_results")
+    def _store_batch_results(self, folder: str, batch_) -> None:
+        if batch_.status != "completed":
+            logger.error(f"Batch {batch_.id} ended with status {batch_.status}")
+        if batch_.output_file_id is None and batch_.error_file_id is None:
+            logger.error(f"No output nor error file for {batch_.id}, error Unknown")
+            if self.index is not None:
+                self.index.release_batch(batch_.id)
+            return
+
+        # Upload the JSONL files to S3 with "text/plain" content type for better browser display
+        c_type = "text/plain"  # for better browser display, not "application/x-ndjson"
+        for suffix, file_id in (
+            ("", batch_.output_file_id),
+            ("_errors", batch_.error_file_id),
+        ):
+            if file_id is None:
+                continue
+            # Streamed from OpenAI into a multipart upload, never held in memory
+            with self.client.files.with_streaming_response.content(file_id) as response:
+                status = self.bucket.upload_stream_to_s3(
+                    f"{batch_.id}{suffix}.jsonl",
+                    response.iter_bytes(S3_STREAM_CHUNK_SIZE),
+                    folder,
+                    content_type=c_type,
+                )
+            if status:
+                raise RuntimeError(f"Upload of {folder}/{batch_.id}{suffix} failed")
+        logger.info(f"Results of {batch_.id} stored in {folder}")
+        if self.index is not None:
+            if batch_.status == "completed":
+                self.index.record_retrieved(batch_.id, f"{folder}/{batch_.id}.jsonl")
+            else:
+                self.index.release_batch(batch_.id)
 
-    def check_batch_status(self):
-        batch_ = self.client.batches.retrieve(self.batch_id)
+    def check_batch_status(self, batch_id: str = None):
+        batch_ = self.client.batches.retrieve(batch_id or self.batch_id)
         # todo: add additional checks
         return batch_.status != "completed"
 
@@ -177,3 +635,5 @@ if __name__ == "__main__":
     # batch_manager.generate_json_batch()
     # batch_manager.send_batch_request()
     batch_manager.retrieve_results(batch_task_id="batch_m2nkzwZjq0vKfxxJ6BEiqWnD")
+    # batch_manager.retrieve_results(group_file=batch_manager.group_file)
+    # Several groups can be supervised by a single process with BatchTracker
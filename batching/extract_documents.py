@@ -0,0 +1,30 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+from pathlib import Path
+from typing import Optional
+import typer
+
+# Internal imports
+from config import DATA_DIR, EXTRACT_WORKERS, EXTRACT_CHUNKSIZE
+from batching.extraction import extract_directory
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    input_dir: Path = typer.Option(DATA_DIR, help="Folder of the documents"),
+    output_dir: Optional[Path] = typer.Option(None, help="DATA_DIR/extracted"),
+    workers: int = typer.Option(EXTRACT_WORKERS, help="Processes, 0 runs inline"),
+    chunksize: int = typer.Option(EXTRACT_CHUNKSIZE, help="Documents per task"),
+    force: bool = typer.Option(False, help="Convert up to date documents again"),
+):
+    # Convert every document under input_dir to text, see extract_directory
+    extract_directory(input_dir, output_dir, workers, chunksize, force)
+
+
+if __name__ == "__main__":
+    app()
@@ -4,25 +4,211 @@ contact@analitika.fr
 """
 # External imports
 import os
-from docx import Document
+import posixpath
+import re
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, NamedTuple, Optional, Tuple, Union
+from lxml.etree import iterparse, parse
 
 # Internal imports
 from config import DATA_DIR
 
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+OFFICE_DOCUMENT = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+)
+STYLES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+BODY, P, PPR, R, T, BR = (f"{W}{tag}" for tag in ("body", "p", "pPr", "r", "t", "br"))
+HYPERLINK = f"{W}hyperlink"
+
+# Text equivalent of the run children, as in python-docx (CT_R.text)
+RUN_TEXT = {f"{W}cr": "\n", f"{W}noBreakHyphen": "-", f"{W}ptab": "\t", f"{W}tab": "\t"}
+# Built-in styles whose stored name differs from the name displayed by Word
+UI_STYLE_NAMES = {"caption": "Caption", "footer": "Footer", "header": "Header"}
+UI_STYLE_NAMES.update({f"heading {n}": f"Heading {n}" for n in range(1, 10)})
+HEADING_STYLE = re.compile(r"^Heading ([1-9])$")
+STYLES_CACHE_SIZE = 256
+_STYLES_CACHE: Dict[Tuple[int, int], tuple] = {}
+
+
+class DocxParagraph(NamedTuple):
+    text: str
+    style: Optional[str]  # style name, e.g. "Heading 1", "Normal"
+    level: Optional[int]  # heading level, None for body text
+    urls: Tuple[str, ...] = ()  # targets of the external hyperlinks
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    # Relationships of a part: id -> (type, target resolved against the part folder)
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, "_rels", f"{name}.rels")
+    if rels_path not in archive.namelist():
+        return {}
+    with archive.open(rels_path) as rels_file:
+        root = parse(rels_file).getroot()
+    relationships = {}
+    for rel in root.iter(f"{REL}Relationship"):
+        target = rel.get("Target")
+        if rel.get("TargetMode") != "External":
+            target = posixpath.normpath(posixpath.join(folder, target)).lstrip("/")
+        relationships[rel.get("Id")] = (rel.get("Type"), target)
+    return relationships
+
+
+def _read_styles(archive: zipfile.ZipFile, styles_part: Optional[str]):
+    # Paragraph styles: id -> (name, heading level), plus the default style id
+    if styles_part is None or styles_part not in archive.namelist():
+        return {}, None
+    # Documents made from the same template share their styles.xml, the CRC
+    # stored in the zip directory identifies it without decompressing it
+    info = archive.getinfo(styles_part)
+    key = (info.CRC, info.file_size)
+    if key not in _STYLES_CACHE:
+        if len(_STYLES_CACHE) >= STYLES_CACHE_SIZE:
+            _STYLES_CACHE.clear()
+        with archive.open(styles_part) as styles_file:
+            _STYLES_CACHE[key] = _parse_styles(parse(styles_file).getroot())
+    return _STYLES_CACHE[key]
+
+
+def _parse_styles(root):
+
+    raw, default_id = {}, None
+    for style in root.iter(f"{W}style"):
+        if style.get(f"{W}type") != "paragraph":
+            continue
+        style_id = style.get(f"{W}styleId")
+        name = style.find(f"{W}name")
+        name = (
+            UI_STYLE_NAMES.get(name.get(f"{W}val"), name.get(f"{W}val"))
+            if name is not None
+            else None
+        )
+        based_on = style.find(f"{W}basedOn")
+        outline = style.find(f"{W}pPr/{W}outlineLvl")
+        raw[style_id] = (
+            name,
+            based_on.get(f"{W}val") if based_on is not None else None,
+            int(outline.get(f"{W}val")) if outline is not None else None,
+        )
+        if style.get(f"{W}default") in ("1", "true", "on"):
+            default_id = style_id
+
+    styles = {}
+    for style_id, (name, based_on, outline) in raw.items():
+        match = HEADING_STYLE.match(name or "")
+        if match:
+            level = int(match.group(1))
+        else:
+            # The outline level is inherited through the basedOn chain
+            seen = {style_id}
+            while outline is None and based_on in raw and based_on not in seen:
+                seen.add(based_on)
+                _, based_on, outline = raw[based_on]
+            level = outline + 1 if outline is not None and outline < 9 else None
+        styles[style_id] = (name, level)
+    return styles, default_id
 
-def extract_text_from_docx(docx_path):
-    # Load the document
-    doc = Document(docx_path)
 
-    # Initialize an empty string for the full text
-    full_text = []
+def _open_archive(source: Union[str, Path, bytes, BinaryIO]) -> zipfile.ZipFile:
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    return zipfile.ZipFile(source)
 
-    # Iterate over each paragraph in the document
-    for paragraph in doc.paragraphs:
-        full_text.append(paragraph.text)
 
+def iter_docx_paragraphs(
+    source: Union[str, Path, bytes, BinaryIO], with_structure: bool = True
+) -> Iterator[DocxParagraph]:
+    """
+    Stream the body paragraphs of a docx without building a python-docx Document.
+    word/document.xml is read straight from the zip with lxml's incremental parser,
+    and the text of each paragraph is the same as python-docx's Paragraph.text.
+    :param source: Path, bytes or binary file object of the docx
+    :param with_structure: Read the styles and hyperlinks, without it the paragraphs
+                           only hold their text
+    :return: Iterator of paragraphs with their style name, heading level and links
+    """
+    with _open_archive(source) as archive:
+        package_rels = _relationships(archive, "")
+        document_part = next(
+            (
+                target
+                for kind, target in package_rels.values()
+                if kind == OFFICE_DOCUMENT
+            ),
+            "word/document.xml",
+        )
+        styles, default_id, links = {}, None, {}
+        if with_structure:
+            document_rels = _relationships(archive, document_part)
+            styles_part = next(
+                (target for kind, target in document_rels.values() if kind == STYLES),
+                None,
+            )
+            styles, default_id = _read_styles(archive, styles_part)
+            links = {rel_id: target for rel_id, (_, target) in document_rels.items()}
+
+        with archive.open(document_part) as document:
+            yield from _iter_body_paragraphs(document, styles, default_id, links)
+
+
+def _run_text(run) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == T:
+            parts.append(child.text or "")
+        elif tag == BR:
+            if child.get(f"{W}type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag in RUN_TEXT:
+            parts.append(RUN_TEXT[tag])
+    return "".join(parts)
+
+
+def _iter_body_paragraphs(
+    document, styles, default_id, links
+) -> Iterator[DocxParagraph]:
+    # Only the end of w:p elements reaches Python, the rest is parsed by libxml2
+    for _, paragraph in iterparse(document, events=("end",), tag=P):
+        body = paragraph.getparent()
+        if body.tag != BODY:
+            continue  # paragraphs of tables, text boxes...
+
+        style_id, outline, parts, urls = None, None, [], []
+        for child in paragraph:
+            if child.tag == R:
+                parts.append(_run_text(child))
+            elif child.tag == HYPERLINK:
+                parts.extend(_run_text(run) for run in child.iterchildren(R))
+                url = links.get(child.get(R_ID))
+                if url and url not in urls:
+                    urls.append(url)
+            elif child.tag == PPR:
+                style = child.find(f"{W}pStyle")
+                style_id = style.get(f"{W}val") if style is not None else None
+                level = child.find(f"{W}outlineLvl")
+                outline = int(level.get(f"{W}val")) if level is not None else None
+
+        name, level = styles.get(style_id, styles.get(default_id, (None, None)))
+        if outline is not None:
+            level = outline + 1 if outline < 9 else None
+        yield DocxParagraph("".join(parts), name, level, tuple(urls))
+
+        # Body children are dropped once read, memory stays flat
+        paragraph.clear()
+        while paragraph.getprevious() is not None:
+            del body[0]
+
+
+def extract_text_from_docx(docx_path):
     # Join all the paragraphs with a newline character
-    return "\n".join(full_text)
+    paragraphs = iter_docx_paragraphs(docx_path, with_structure=False)
+    return "\n".join(paragraph.text for paragraph in paragraphs)
 
 
 def main():
@@ -0,0 +1,298 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import os
+import posixpath
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from io import BytesIO
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+from loguru import logger
+
+# Internal imports
+from config import DATA_DIR, EXTRACT_WORKERS, EXTRACT_CHUNKSIZE
+from batching.extract_text_from_docx import DocxParagraph, iter_docx_paragraphs
+
+# Format name -> function turning the raw bytes into paragraphs. Every format yields
+# DocxParagraph tuples, so the text and the local structurer work the same way
+EXTRACTORS: Dict[str, Callable[[bytes], List[DocxParagraph]]] = {}
+
+
+def register_extractor(*formats: str):
+    """
+    Register a handler for one or more formats (file extensions without the dot).
+    :param formats: e.g. "htm", "html"
+    :return: Decorator of the handler, called with the raw bytes of a document
+    """
+
+    def decorator(func):
+        for fmt in formats:
+            EXTRACTORS[fmt.lower()] = func
+        return func
+
+    return decorator
+
+
+def format_of(name: str, default: str = "docx") -> str:
+    # Extension of a file name or of the path of a URL
+    extension = posixpath.splitext(urlparse(name).path)[1].lstrip(".").lower()
+    return extension if extension in EXTRACTORS else default
+
+
+def _decode(content: bytes) -> str:
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return content.decode("latin-1")
+
+
+@register_extractor("docx")
+def extract_docx(content: bytes) -> List[DocxParagraph]:
+    return list(iter_docx_paragraphs(content))
+
+
+@register_extractor("txt")
+def extract_txt(content: bytes) -> List[DocxParagraph]:
+    return [DocxParagraph(line, None, None) for line in _decode(content).splitlines()]
+
+
+class _HtmlParagraphs(HTMLParser):
+    # Block elements close the current paragraph, h1-h6 give its heading level
+    BLOCKS = {"p", "div", "li", "tr", "td", "th", "br", "blockquote", "pre", "title"}
+    HEADINGS = {f"h{level}": level for level in range(1, 7)}
+    SKIPPED = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[DocxParagraph] = []
+        self._parts, self._urls = [], []
+        self._style, self._level = None, None
+        self._skipping = 0
+
+    def _flush(self):
+        text = " ".join("".join(self._parts).split())
+        if text:
+            self.paragraphs.append(
+                DocxParagraph(text, self._style, self._level, tuple(self._urls))
+            )
+        self._parts, self._urls = [], []
+        self._style, self._level = None, None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skipping += 1
+        elif tag in self.HEADINGS or tag in self.BLOCKS:
+            self._flush()
+            if tag in self.HEADINGS:
+                self._style, self._level = f"Heading {tag[1]}", self.HEADINGS[tag]
+            elif tag == "title":
+                self._style = "Title"
+        elif tag == "a":
+            href = dict(attrs).get("href") or ""
+            if href.startswith(("http://", "https://")) and href not in self._urls:
+                self._urls.append(href)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.HEADINGS or tag in self.BLOCKS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._parts.append(data)
+
+
+@register_extractor("htm", "html")
+def extract_html(content: bytes) -> List[DocxParagraph]:
+    parser = _HtmlParagraphs()
+    parser.feed(_decode(content))
+    parser.close()
+    parser._flush()
+    return parser.paragraphs
+
+
+@register_extractor("pdf")
+def extract_pdf(content: bytes) -> List[DocxParagraph]:
+    # PDFs carry no paragraph styles, every line is body text
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("pypdf is required to extract text from PDF files")
+    paragraphs = []
+    for page in PdfReader(BytesIO(content)).pages:
+        for line in (page.extract_text() or "").splitlines():
+            paragraphs.append(DocxParagraph(line, None, None))
+    return paragraphs
+
+
+def extract(content: bytes, fmt: str) -> List[DocxParagraph]:
+    """
+    :param content: Raw bytes of the document
+    :param fmt: Registered format, see format_of
+    :return: The paragraphs of the document
+    """
+    if fmt not in EXTRACTORS:
+        raise ValueError(f"No extractor registered for {fmt!r}")
+    return EXTRACTORS[fmt](content)
+
+
+def to_text(paragraphs: Iterable[DocxParagraph]) -> str:
+    return "\n".join(paragraph.text for paragraph in paragraphs)
+
+
+def _extract_many(chunk: List[Tuple[bytes, str]]) -> List[tuple]:
+    # Runs in a worker: (paragraphs, None) or (None, error) for each (content, fmt)
+    results = []
+    for content, fmt in chunk:
+        try:
+            results.append((extract(content, fmt), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class ExtractionPool:
+    """
+    Run the extractors on a process pool, so that parsing uses every core and never
+    holds the GIL of the threads doing network I/O. Workers are spawned rather than
+    forked, forking a process that already runs download threads is not safe.
+    With workers=0 the extraction runs inline, in the calling thread.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS):
+        self.workers = max(0, workers)
+        self._pool = None
+        if self.workers:
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=get_context("spawn")
+            )
+
+    def paragraphs(self, content: bytes, fmt: str) -> List[DocxParagraph]:
+        if self._pool is None:
+            return extract(content, fmt)
+        return self._pool.submit(extract, content, fmt).result()
+
+    def paragraphs_many(self, documents: List[Tuple[bytes, str]]) -> List[tuple]:
+        """
+        Extract several documents in a single task of the pool.
+        :param documents: (content, fmt) of each document
+        :return: (paragraphs, None), or (None, error) for a document that failed, in
+                 the order of the documents
+        """
+        if self._pool is None:
+            return _extract_many(documents)
+        return self._pool.submit(_extract_many, documents).result()
+
+    def map_chunks(
+        self, func: Callable, items: Iterable, chunksize: int = EXTRACT_CHUNKSIZE
+    ) -> Iterator:
+        """
+        Call func with chunks of items (one task per chunk, not per item) and yield
+        its results in order. Only 2 chunks per worker are queued at once.
+        :param func: Picklable function taking a list of items
+        """
+        items = iter(items)
+        chunks = iter(lambda: list(islice(items, max(1, chunksize))), [])
+        if self._pool is None:
+            yield from map(func, chunks)
+            return
+        window = deque(
+            self._pool.submit(func, chunk) for chunk in islice(chunks, 2 * self.workers)
+        )
+        while window:
+            result = window.popleft().result()
+            for chunk in islice(chunks, 1):
+                window.append(self._pool.submit(func, chunk))
+            yield result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _convert_files(chunk: List[tuple]) -> List[tuple]:
+    # Runs in a worker: read, extract and write each file, only statuses go back
+    results = []
+    for source, target in chunk:
+        try:
+            with open(source, "rb") as file:
+                text = to_text(extract(file.read(), format_of(source)))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "w", encoding="utf-8") as file:
+                file.write(text)
+            results.append((source, None))
+        except Exception as e:
+            results.append((source, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def iter_local_documents(input_dir: Path, output_dir: Path, force: bool = False):
+    """
+    Find the documents of a registered format under input_dir that have no text
+    in output_dir yet, or an older one.
+    :return: Iterator of (source, target) paths
+    """
+    for root, dirs, files in os.walk(input_dir):
+        # The output folder may live inside the input folder (DATA_DIR/extracted)
+        dirs[:] = [d for d in dirs if Path(root, d).resolve() != output_dir.resolve()]
+        for name in files:
+            extension = os.path.splitext(name)[1].lstrip(".").lower()
+            if extension not in EXTRACTORS:
+                continue
+            source = Path(root, name)
+            relative = source.relative_to(input_dir)
+            target = output_dir / relative.with_name(relative.name + ".txt")
+            if force or not target.exists():
+                yield str(source), str(target)
+            elif target.stat().st_mtime < source.stat().st_mtime:
+                yield str(source), str(target)
+
+
+def extract_directory(
+    input_dir: Path = DATA_DIR,
+    output_dir: Optional[Path] = None,
+    workers: int = EXTRACT_WORKERS,
+    chunksize: int = EXTRACT_CHUNKSIZE,
+    force: bool = False,
+) -> List[str]:
+    """
+    Convert every document under input_dir to a text file in output_dir, keeping the
+    folder layout (report.docx -> report.docx.txt).
+    :param output_dir: DATA_DIR/extracted by default
+    :param force: Also convert the documents whose text is up to date
+    :return: The files that could not be converted
+    """
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir or DATA_DIR / "extracted")
+    start = perf_counter()
+    done, failed = 0, []
+    with ExtractionPool(workers) as pool:
+        documents = iter_local_documents(input_dir, output_dir, force)
+        for results in pool.map_chunks(_convert_files, documents, chunksize):
+            for source, error in results:
+                if error is None:
+                    done += 1
+                else:
+                    logger.error(f"Extraction of {source} failed: {error}")
+                    failed.append(source)
+    elapsed = max(perf_counter() - start, 1e-9)
+    logger.info(
+        f"{done} documents extracted to {output_dir} in {elapsed:.1f}s "
+        f"({done / elapsed:.1f} docs/s), {len(failed)} failed"
+    )
+    return failed
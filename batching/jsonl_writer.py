@@ -0,0 +1,137 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import json
+import os
+from pathlib import Path
+from typing import Callable, List, Union
+from loguru import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Internal imports
+from config import BATCH_MAX_REQUESTS, BATCH_MAX_BYTES, BATCH_JSON_ENCODER
+
+
+def get_encoder(name: str = BATCH_JSON_ENCODER) -> Callable[[dict], bytes]:
+    """
+    :param name: "orjson" for the faster encoder when it is installed, "json" otherwise
+    :return: Function serializing an entry to a JSONL line
+    """
+    if name == "orjson":
+        if orjson is not None:
+            return lambda entry: orjson.dumps(entry) + b"\n"
+        logger.warning("orjson is not installed, falling back to json")
+    return lambda entry: (json.dumps(entry) + "\n").encode("utf-8")
+
+
+class ShardedJsonlWriter:
+    """
+    Write JSONL entries to numbered shards ({prefix}_000.jsonl, {prefix}_001.jsonl...),
+    starting a new shard whenever the next line would exceed the request count or
+    byte size limits of a single OpenAI batch.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        prefix: str,
+        max_requests: int = BATCH_MAX_REQUESTS,
+        max_bytes: int = BATCH_MAX_BYTES,
+        encoder: str = BATCH_JSON_ENCODER,
+    ):
+        """
+        :param directory: Folder of the shards, shards of a previous run are removed
+        :param prefix: Name of the shards without their number and extension
+        :param max_requests: Maximum number of lines per shard
+        :param max_bytes: Maximum size of a shard in bytes
+        :param encoder: JSON encoder, see get_encoder
+        """
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self._encode = get_encoder(encoder)
+        self.paths: List[Path] = []
+        self.entries = 0
+        self.bytes_written = 0
+        self._file = None
+        self._shard_requests = 0
+        self._shard_bytes = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for old_shard in self.directory.glob(f"{prefix}_*.jsonl"):
+            os.remove(old_shard)
+
+    def _roll(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        path = self.directory / f"{self.prefix}_{len(self.paths):03d}.jsonl"
+        self.paths.append(path)
+        self._file = open(path, "wb")
+        self._shard_requests = 0
+        self._shard_bytes = 0
+
+    def write(self, entry: dict) -> int:
+        """
+        :return: Size of the written line in bytes
+        """
+        line = self._encode(entry)
+        if len(line) > self.max_bytes:
+            logger.error(f"Entry {entry.get('custom_id')} exceeds the shard size")
+        full = (
+            self._shard_requests >= self.max_requests
+            or self._shard_bytes + len(line) > self.max_bytes
+        )
+        if self._file is None or (full and self._shard_requests > 0):
+            self._roll()
+        self._write_line(line)
+        return len(line)
+
+    def write_group(self, entries: List[dict]) -> List[int]:
+        """
+        Write entries that must be sent in the same batch (the parts of a document),
+        starting a new shard first if they do not all fit in the current one.
+        :return: Size of each written line in bytes
+        :raises ValueError: If the entries exceed the limits of a whole shard
+        """
+        if len(entries) == 1:
+            return [self.write(entries[0])]
+        lines = [self._encode(entry) for entry in entries]
+        size = sum(len(line) for line in lines)
+        if len(lines) > self.max_requests or size > self.max_bytes:
+            raise ValueError(
+                f"{len(lines)} entries of {size} bytes exceed the size of a shard"
+            )
+        fits = (
+            self._shard_requests + len(lines) <= self.max_requests
+            and self._shard_bytes + size <= self.max_bytes
+        )
+        if self._file is None or not fits:
+            self._roll()
+        for line in lines:
+            self._write_line(line)
+        return [len(line) for line in lines]
+
+    def _write_line(self, line: bytes) -> None:
+        self._file.write(line)
+        self._shard_requests += 1
+        self._shard_bytes += len(line)
+        self.entries += 1
+        self.bytes_written += len(line)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,327 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import json
+import os
+import threading
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+import typer
+from botocore.exceptions import BotoCoreError, ClientError
+from loguru import logger
+
+# Internal imports
+from config import (
+    DATA_DIR,
+    BATCH_OUTPUT_FOLDER,
+    STRUCTURED_DATA_FOLDER,
+    POSTPROCESS_WORKERS,
+    S3_FETCH_RETRIES,
+    BATCH_INCREMENTAL,
+    BATCH_INDEX_PATH,
+)
+from tools import S3Manager
+from batching.batch_index import BatchIndex
+from batching.chunking import merge_parts, parse_part_id
+from tools.concurrency import ordered_map
+from tools.metrics import metrics
+
+app = typer.Typer()
+
+
+class InvalidResult(ValueError):
+    def __init__(self, reason: str, custom_id: Optional[str] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.custom_id = custom_id
+
+
+def _as_sections(document) -> list:
+    # The model answers with a JSON object, the sections are either the object
+    # itself or the list held by one of its keys (e.g. "sections")
+    if isinstance(document, list):
+        return document
+    if isinstance(document, dict):
+        if "h_title" in document:
+            return [document]
+        lists = [value for value in document.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return lists[0]
+    raise InvalidResult("no list of sections found")
+
+
+def validate_sections(document) -> List[dict]:
+    """
+    Check the model output against the h_title/main_title/level/content schema.
+    :param document: The parsed JSON answer of the model
+    :return: The list of sections, with missing url/urls set to None
+    :raises InvalidResult: If the answer does not follow the schema
+    """
+    sections = _as_sections(document)
+    if not sections:
+        raise InvalidResult("empty list of sections")
+    for idx, section in enumerate(sections):
+        if not isinstance(section, dict):
+            raise InvalidResult(f"section {idx} is not an object")
+        for field in ("h_title", "main_title"):
+            if not isinstance(section.get(field), str):
+                raise InvalidResult(f"section {idx} has no {field}")
+        level = section.get("level")
+        if isinstance(level, str) and level.isdigit():
+            level = section["level"] = int(level)
+        if not isinstance(level, int) or not 1 <= level <= 6:
+            raise InvalidResult(f"section {idx} has an invalid level {level!r}")
+        content = section.get("content")
+        if not isinstance(content, list):
+            raise InvalidResult(f"section {idx} has no content array")
+        for item in content:
+            if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+                raise InvalidResult(f"section {idx} has a content without text")
+            item.setdefault("url", None)
+            item.setdefault("urls", None)
+            if item["url"] is not None and not isinstance(item["url"], str):
+                raise InvalidResult(f"section {idx} has an invalid url")
+            if item["urls"] is not None and not isinstance(item["urls"], list):
+                raise InvalidResult(f"section {idx} has invalid urls")
+    return sections
+
+
+def parse_result_line(line: str) -> Tuple[Optional[str], List[dict]]:
+    """
+    Extract and validate the sections of one line of a batch output file.
+    :return: The custom_id of the request and its sections
+    :raises InvalidResult: If the request failed or its answer is invalid
+    """
+    try:
+        result = json.loads(line)
+    except ValueError:
+        raise InvalidResult("unreadable line")
+    custom_id = result.get("custom_id")
+    if not custom_id:
+        raise InvalidResult("no custom_id")
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        raise InvalidResult("request failed", custom_id)
+    try:
+        choice = response["body"]["choices"][0]
+        content = choice["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        raise InvalidResult("no message in the response", custom_id)
+    if choice.get("finish_reason") == "length":
+        raise InvalidResult("truncated answer", custom_id)
+    try:
+        document = json.loads(content)
+    except (TypeError, ValueError):
+        raise InvalidResult("answer is not valid JSON", custom_id)
+    try:
+        return custom_id, validate_sections(document)
+    except InvalidResult as e:
+        raise InvalidResult(e.reason, custom_id)
+
+
+def structured_name(custom_id: str) -> str:
+    # FR/123.txt -> FR/123.json
+    return os.path.splitext(custom_id)[0] + ".json"
+
+
+class ResultsProcessor:
+    """
+    Fan a batch output out into one structured JSON per custom_id in
+    STRUCTURED_DATA_FOLDER. Output files are streamed line by line, and lines are
+    parsed, validated and uploaded on a thread pool. The custom_id of every failed or
+    invalid row is collected, so that a retry batch can be built from them. The result of
+    a request sent for several identical documents is written for each of them. The
+    parts of a document split by split_document are held until the last one arrives,
+    and written as one document, see merge_parts.
+    """
+
+    def __init__(
+        self,
+        bucket: S3Manager = None,
+        max_workers: int = POSTPROCESS_WORKERS,
+        index: Optional[BatchIndex] = None,
+        aliases: Optional[Dict[str, List[str]]] = None,
+    ):
+        """
+        :param index: BatchIndex updated with the location of every result, or failure
+        :param aliases: Documents with the same text as a custom_id of the batch, that
+                        get a copy of its result, see load_aliases
+        """
+        self.bucket = bucket or S3Manager()
+        self.max_workers = max_workers
+        self.index = index
+        self.aliases = aliases or {}
+        self.written = 0
+        self.done: List[Tuple[str, str]] = []
+        self.failed: List[str] = []
+        self.reasons = {}
+        # custom_id -> {part: sections} of the documents sent in several parts
+        self.parts: Dict[str, Dict[int, List[dict]]] = {}
+        self._failed_ids = set()
+        self._lock = threading.Lock()
+
+    def iter_lines(self, job_name: str) -> Iterator[str]:
+        folder = f"{BATCH_OUTPUT_FOLDER}/{job_name}"
+        try:
+            names = sorted(obj["name"] for obj in self.bucket.iter_objects(folder))
+        except ClientError as e:
+            logger.error(str(e))
+            return
+        for name in names:
+            for line in self.bucket.iter_lines_from_s3(name, folder):
+                if line.strip():
+                    yield line
+
+    def process_line(self, line: str) -> bool:
+        try:
+            custom_id, sections = parse_result_line(line)
+        except InvalidResult as e:
+            self._failed(e.custom_id, e.reason)
+            return False
+
+        custom_id, part, parts = parse_part_id(custom_id)
+        if part is not None:
+            with self._lock:
+                if custom_id in self._failed_ids:  # another part failed
+                    return False
+                received = self.parts.setdefault(custom_id, {})
+                received[part] = sections
+                if len(received) < parts:
+                    return True
+            # Kept until written, a retry of the last part finds the others again
+            self._write(custom_id, merge_parts([received[i] for i in sorted(received)]))
+            with self._lock:
+                self.parts.pop(custom_id, None)
+            return True
+        self._write(custom_id, sections)
+        return True
+
+    def _write(self, custom_id: str, sections: List[dict]) -> None:
+        written = []
+        for target in [custom_id] + self.aliases.get(custom_id, []):
+            document = {"custom_id": target, "sections": sections, "source": "batch"}
+            if target != custom_id:
+                document["duplicate_of"] = custom_id
+            name = structured_name(target)
+            status = self.bucket.upload_to_s3(
+                name,
+                json.dumps(document, ensure_ascii=False).encode("utf-8"),
+                STRUCTURED_DATA_FOLDER,
+                content_type="application/json",
+            )
+            if status:
+                raise RuntimeError(f"Upload of {target} failed")
+            written.append((target, f"{STRUCTURED_DATA_FOLDER}/{name}"))
+        with self._lock:
+            self.written += len(written)
+            self.done.extend(written)
+
+    def _failed(self, custom_id: Optional[str], reason: str) -> None:
+        # A failed part fails the whole document, its other parts are dropped
+        custom_id = parse_part_id(custom_id)[0]
+        with self._lock:
+            if custom_id is not None and custom_id not in self._failed_ids:
+                self._failed_ids.add(custom_id)
+                self.failed.append(custom_id)
+                self.failed.extend(self.aliases.get(custom_id, []))
+                self.parts.pop(custom_id, None)
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    @metrics.staged("post_process")
+    def run(self, job_name: str) -> List[str]:
+        """
+        Process every output file of a job (BATCH_OUTPUT_FOLDER/<job_name>).
+        :param job_name: Name of the job, as used by BatchManager.retrieve_results
+        :return: The custom_ids to send again in a retry batch
+        """
+        start = perf_counter()
+        rows = 0
+        results = ordered_map(
+            self.process_line,
+            self.iter_lines(job_name),
+            max_workers=self.max_workers,
+            retries=S3_FETCH_RETRIES,
+            # Failed uploads, and connection errors that upload_to_s3 lets through
+            retry_on=(RuntimeError, BotoCoreError),
+        )
+        for line, ok in results:
+            rows += 1
+            if ok is None:  # upload failed after every retry
+                self._failed(json.loads(line).get("custom_id"), "upload failed")
+        for custom_id in list(self.parts):
+            self._failed(custom_id, "missing parts")
+
+        if self.index is not None:
+            self.index.record_done(self.done)
+            self.index.record_failed(set(self.failed))
+
+        elapsed = max(perf_counter() - start, 1e-9)
+        logger.info(
+            f"{rows} results processed in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s): "
+            f"{self.written} written to {STRUCTURED_DATA_FOLDER}, "
+            f"{len(self.failed)} to retry {self.reasons}"
+        )
+        return sorted(set(self.failed))
+
+
+def load_aliases(job_name: str) -> Dict[str, List[str]]:
+    # Duplicates recorded in the batch group manifest of a job by generate_json_batch
+    group_file = os.path.join(DATA_DIR, "batch_ids", f"{job_name}.json")
+    if not os.path.exists(group_file):
+        return {}
+    with open(group_file, "r") as file:
+        return json.load(file).get("aliases", {})
+
+
+def process_batch_output(job_name: str, max_workers: int = POSTPROCESS_WORKERS):
+    """
+    Write the structured documents of a job and record the custom_ids to retry
+    in DATA_DIR/raw/<job_name>-retry.txt.
+    :return: The custom_ids to retry
+    """
+    index = BatchIndex(BATCH_INDEX_PATH) if BATCH_INCREMENTAL else None
+    try:
+        processor = ResultsProcessor(
+            max_workers=max_workers, index=index, aliases=load_aliases(job_name)
+        )
+        failed = processor.run(job_name)
+    finally:
+        if index is not None:
+            index.close()
+    if failed:
+        retry_file = os.path.join(DATA_DIR, "raw", f"{job_name}-retry.txt")
+        os.makedirs(os.path.dirname(retry_file), exist_ok=True)
+        with open(retry_file, "w", encoding="utf-8") as file:
+            file.write("\n".join(failed) + "\n")
+        logger.info(f"{len(failed)} documents to retry listed in {retry_file}")
+    return failed
+
+
+def build_retry_batch(failed: List[str], batch_name: str):
+    """
+    Build the JSONL shards (retry_prompts_NNN.jsonl) of a batch with the failed documents.
+    :return: The BatchManager, ready for send_batch_request
+    """
+    # Imported here, create_batch imports this module
+    from batching.create_batch import BatchManager
+
+    batch_manager = BatchManager(batch_name)
+    batch_manager.generate_json_batch(files=failed, shard_prefix="retry_prompts")
+    return batch_manager
+
+
+@app.command()
+def main(
+    job_name: str,
+    workers: int = typer.Option(POSTPROCESS_WORKERS, help="Concurrent uploads"),
+    retry: bool = typer.Option(False, help="Build a retry batch of the failures"),
+):
+    failed = process_batch_output(job_name, workers)
+    if retry and failed:
+        build_retry_batch(failed, f"{job_name}-retry")
+
+
+if __name__ == "__main__":
+    app()
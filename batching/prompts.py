@@ -0,0 +1,237 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import csv
+import hashlib
+import re
+import textwrap
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+from loguru import logger
+
+# Internal imports
+from tools.metrics import metrics
+
+# Rough size of a token, to estimate the input tokens and the rate limits
+CHARS_PER_TOKEN = 4
+# OpenAI only caches prompt prefixes from this size on
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def compact(text: str) -> str:
+    """
+    A template without the indentation of the source code, trailing spaces and runs of
+    blank lines, which every request would otherwise pay for.
+    """
+    lines = [line.rstrip() for line in textwrap.dedent(text).split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip("\n")
+
+
+def normalize_text(text: str) -> str:
+    # One paragraph per line, inner runs of whitespace and empty lines removed
+    lines = (" ".join(line.split()) for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def prompt_chars(body: dict) -> int:
+    # Characters of the messages of a chat completions request
+    return sum(len(message["content"]) for message in body["messages"])
+
+
+class PromptTemplate(NamedTuple):
+    """
+    Messages of the requests of a batch. system is the same for every request, it is
+    the prefix that prompt caching can reuse; user holds the {content} of the document,
+    preceded by the part note ({part}, {parts}, {title}) for a document sent in parts.
+    """
+
+    name: str
+    system: str
+    user: str
+    part: str
+    normalize: bool = True  # compact the templates and normalize the texts
+
+    @classmethod
+    def create(
+        cls, name: str, system: str, user: str, part: str, normalize: bool = True
+    ) -> "PromptTemplate":
+        if normalize:
+            system, user, part = compact(system), compact(user), compact(part) + "\n\n"
+        return cls(name, system, user, part, normalize)
+
+    def version(self, model: Optional[str]) -> str:
+        # Any change of the prompt or of the model makes the previous results stale
+        prompt = f"{model}\n{self.system}\n{self.user}\n{self.part}"
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+    def prepare(self, text: str) -> str:
+        # The raw text of a document as it is put in the prompt
+        return normalize_text(text) if self.normalize else text
+
+    def messages(
+        self,
+        content: str,
+        part: Optional[int] = None,
+        parts: Optional[int] = None,
+        title: str = "",
+    ) -> List[dict]:
+        context = ""
+        if part is not None:
+            context = self.part.format(part=part, parts=parts, title=title)
+        user = context + self.user.format(content=content)
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": user.strip() if self.normalize else user},
+        ]
+
+    def overhead(self) -> int:
+        # Characters of a prompt that are not the text of the document
+        return len(self.system) + len(self.user) + len(self.part)
+
+
+INSTRUCTIONS = """
+            ### Instructions:
+            1. Identify and structure the content according to the sections defined by headings (H1, H2, H3, H4).
+            2. For each section, create an object with the following fields:
+               - **h_title**: The heading of the section.
+               - **main_title**: The highest-level title for the article (typically H1).
+               - **level**: The heading level (1 for H1, 2 for H2, etc.).
+               - **content**: An array of content objects, where each object has:
+                 - **text**: The text content following the heading.
+                 - **url**: Set to null unless there is a URL associated with the text.
+                 - **urls**: Set to null unless there are multiple URLs associated with the text.
+            3. Group all related content under the appropriate heading levels.
+            4. Do not convert bullet points into JSON arrays; show them as text.
+            5. Ensure that all text following the headings is included in the correct "content" field.
+            6. Maintain the structure even when the text contains nested subsections.
+            """
+# User message of the original requests, byte for byte (indentation included)
+STRUCTURE_V1_USER = """
+                ### Instructions:
+                1. Identify and structure the content according to the sections defined by headings (H1, H2, H3, H4).
+                2. For each section, create an object with the following fields:
+                   - **h_title**: The heading of the section.
+                   - **main_title**: The highest-level title for the article (typically H1).
+                   - **level**: The heading level (1 for H1, 2 for H2, etc.).
+                   - **content**: An array of content objects, where each object has:
+                     - **text**: The text content following the heading.
+                     - **url**: Set to null unless there is a URL associated with the text.
+                     - **urls**: Set to null unless there are multiple URLs associated with the text.
+                3. Group all related content under the appropriate heading levels.
+                4. Do not convert bullet points into JSON arrays; show them as text.
+                5. Ensure that all text following the headings is included in the correct "content" field.
+                6. Maintain the structure even when the text contains nested subsections.
+
+                ### Text to convert:
+
+                {content}
+                """
+PART_NOTE = """
+            ### Context:
+            The text below is part {part} of {parts} of the document "{title}". Use this
+            title as main_title, and structure only the text of this part.
+            """
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    # Original layout: generic system message, instructions and text in the user
+    # message, identical to the requests sent before the templates were versioned
+    "structure-v1": PromptTemplate.create(
+        "structure-v1",
+        "You are a helpful assistant.",
+        STRUCTURE_V1_USER,
+        PART_NOTE,
+        normalize=False,
+    ),
+    # Instructions in the system message, shared by every request
+    "structure-v2": PromptTemplate.create(
+        "structure-v2",
+        "You are a helpful assistant.\n" + compact(INSTRUCTIONS),
+        "### Text to convert:\n\n{content}",
+        PART_NOTE,
+    ),
+}
+
+
+def get_template(name: str) -> PromptTemplate:
+    if name not in TEMPLATES:
+        raise ValueError(f"Unknown prompt template {name!r}, one of {list(TEMPLATES)}")
+    return TEMPLATES[name]
+
+
+class PromptSizeReport:
+    """
+    Input size of the requests of a batch: written per request to a CSV file, and
+    summed up for the whole batch, with the share of the shared system prefix.
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        """
+        :param path: CSV file of the size of each request, none by default
+        """
+        self.path = None if path is None else Path(path)
+        self.requests = 0
+        self.chars = 0
+        self.bytes = 0
+        self.shared_chars = 0
+        self.max_chars = 0
+        self._file = None
+        self._writer = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(
+                ["custom_id", "prompt_chars", "request_bytes", "input_tokens"]
+            )
+
+    def add(self, request: dict, request_bytes: int) -> None:
+        """
+        :param request: A batch input entry
+        :param request_bytes: Size of its JSONL line
+        """
+        chars = prompt_chars(request["body"])
+        tokens = chars // CHARS_PER_TOKEN + 1
+        self.requests += 1
+        self.chars += chars
+        self.bytes += request_bytes
+        self.shared_chars += len(request["body"]["messages"][0]["content"])
+        self.max_chars = max(self.max_chars, chars)
+        metrics.observe("prompt_chars", chars)
+        metrics.observe("request_bytes", request_bytes)
+        if self._writer is not None:
+            self._writer.writerow([request["custom_id"], chars, request_bytes, tokens])
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "chars": self.chars,
+            "input_tokens": self.chars // CHARS_PER_TOKEN,
+            "mean_tokens": self.chars // CHARS_PER_TOKEN // max(self.requests, 1),
+            "max_tokens": self.max_chars // CHARS_PER_TOKEN,
+            "shared_prefix_share": round(self.shared_chars / max(self.chars, 1), 3),
+        }
+
+    def log(self, template: PromptTemplate) -> None:
+        summary = self.summary()
+        prefix_tokens = len(template.system) // CHARS_PER_TOKEN
+        logger.info(
+            f"Prompt {template.name}: {summary['requests']} requests, "
+            f"{summary['bytes'] / 1024 ** 2:.1f} MB, about {summary['input_tokens']} "
+            f"input tokens ({summary['mean_tokens']} per request, max "
+            f"{summary['max_tokens']}), {summary['shared_prefix_share']:.0%} in the "
+            f"shared system prefix of {prefix_tokens} tokens"
+            + (f", sizes in {self.path}" if self.path is not None else "")
+        )
+        if prefix_tokens < PROMPT_CACHE_MIN_TOKENS:
+            logger.debug(
+                f"System prefix below the {PROMPT_CACHE_MIN_TOKENS} tokens of prompt "
+                f"caching"
+            )
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -3,62 +3,416 @@ Created by Analitika at 03/09/2024
 contact@analitika.fr
 """
 # External imports
-import requests
-import docx
-from io import BytesIO
+import csv
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+from typing import Optional
+from urllib.parse import urlparse
+import typer
 from loguru import logger
-import pandas as pd
 
 # Internal imports
-from tools import S3Manager
-from config import DATA_DIR, RAW_DATA_FOLDER
+from batching.extract_text_from_docx import extract_text_from_docx
+from batching.extraction import ExtractionPool, extract, format_of, to_text
+from batching.post_process import structured_name
+from batching.structure_docx import structure_paragraphs
+from tools import S3Manager, IngestionJournal
+from tools.metrics import metrics
+from config import (
+    DATA_DIR,
+    RAW_DATA_FOLDER,
+    STRUCTURED_DATA_FOLDER,
+    LOCAL_STRUCTURE,
+    INGEST_WORKERS,
+    INGEST_PER_HOST_LIMIT,
+    INGEST_HTTP_TIMEOUT,
+    INGEST_JOURNAL_PATH,
+    EXTRACT_WORKERS,
+    EXTRACT_CHUNKSIZE,
+)
+
+app = typer.Typer()
 
 
 class WordDownloader:
     bucket = S3Manager()
+    # Shared by every downloader so that keep-alive connections are reused across rows
+    session = None
+    per_host = INGEST_PER_HOST_LIMIT
+    _host_slots = {}
+    _lock = threading.Lock()
 
     def __init__(self, site: str):
         self.site = site  # FR | UK to store in AWS
 
-    def download_and_read_docx(self, file_url: str):
-        response = requests.get(file_url)
-        response.raise_for_status()  # Ensure the request was successful
+    @classmethod
+    def configure(cls, pool_size: int, per_host: int):
+        """
+        (Re)build the shared HTTP session.
+        :param pool_size: Number of pooled keep-alive connections per host
+        :param per_host: Maximum number of concurrent requests to the same host
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with cls._lock:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            cls.session = session
+            cls.per_host = max(1, per_host)
+            cls._host_slots = {}
 
-        # Load the content into a docx.Document object
-        doc = docx.Document(BytesIO(response.content))
+    @classmethod
+    @contextmanager
+    def _host_slot(cls, file_url: str):
+        host = urlparse(file_url).netloc
+        with cls._lock:
+            slot = cls._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(cls.per_host)
+                cls._host_slots[host] = slot
+        with slot:
+            yield
 
+    @metrics.timed("download_docx")
+    def download_docx(self, file_url: str) -> bytes:
+        if self.session is None:
+            self.configure(INGEST_WORKERS, INGEST_PER_HOST_LIMIT)
+        with self._host_slot(file_url):
+            response = self.session.get(file_url, timeout=INGEST_HTTP_TIMEOUT)
+            response.raise_for_status()  # Ensure the request was successful
+            metrics.inc("http_bytes_received", len(response.content))
+            return response.content
+
+    def read_docx(self, content: bytes, file_url: str = None):
         try:
-            # Extract the text from the document
-            full_text = []
-            for paragraph in doc.paragraphs:
-                full_text.append(paragraph.text)
+            # Stream the paragraphs out of the zip, no document tree is built
+            return extract_text_from_docx(content)
+        except Exception as e:
+            logger.critical(f"An error occurred {self.site} URL: {file_url}{e}")
+            return None
 
-            return "\n".join(full_text)
+    @metrics.timed("read_paragraphs")
+    def read_paragraphs(
+        self,
+        content: bytes,
+        file_url: str = None,
+        extraction: Optional[ExtractionPool] = None,
+    ):
+        # Paragraphs with their heading levels and links, for the local structurer
+        fmt = format_of(file_url or "")
+        try:
+            if extraction is not None:
+                return extraction.paragraphs(content, fmt)
+            return extract(content, fmt)
         except Exception as e:
             logger.critical(f"An error occurred {self.site} URL: {file_url}{e}")
             return None
 
-    def store(self, content, file_id: str):
+    def download_and_read_docx(self, file_url: str):
+        return self.read_docx(self.download_docx(file_url), file_url)
+
+    @property
+    def folder(self) -> str:
+        return RAW_DATA_FOLDER + f"/{self.site}"
+
+    def s3_key(self, file_id: str) -> str:
+        return f"{self.folder}/{file_id}.txt"
+
+    @metrics.timed("store_raw")
+    def store(self, content, file_id: str) -> int:
         text_bytes = content.encode("utf-8")
-        folder = RAW_DATA_FOLDER + f"/{self.site}"
-        self.bucket.upload_to_s3(file_id + ".txt", text_bytes, folder, "text/plain")
-        logger.info(f"File {file_id} uploaded to S3")
-        return
+        folder = self.folder
+        status = self.bucket.upload_to_s3(
+            file_id + ".txt", text_bytes, folder, "text/plain"
+        )
+        if status == 0:
+            logger.info(f"File {file_id} uploaded to S3")
+        return status
+
+    def store_structured(self, sections: list, file_id: str) -> int:
+        # Same document as the post-processing of a batch output
+        custom_id = f"{self.site}/{file_id}.txt"
+        document = {"custom_id": custom_id, "sections": sections, "source": "docx"}
+        return self.bucket.upload_to_s3(
+            structured_name(custom_id),
+            json.dumps(document, ensure_ascii=False).encode("utf-8"),
+            STRUCTURED_DATA_FOLDER,
+            content_type="application/json",
+        )
+
+
+class IngestionStats:
+    def __init__(self):
+        self.docs = 0
+        self.failed = 0
+        self.skipped = 0
+        self.structured = 0
+        self.bytes = 0
+        self._start = perf_counter()
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        downloaded: int = 0,
+        done: int = 0,
+        failed: int = 0,
+        skipped: int = 0,
+        structured: int = 0,
+    ):
+        with self._lock:
+            self.bytes += downloaded
+            self.docs += done
+            self.failed += failed
+            self.skipped += skipped
+            self.structured += structured
+        if metrics.enabled:
+            for status, count in (
+                ("done", done),
+                ("failed", failed),
+                ("skipped", skipped),
+                ("structured", structured),
+            ):
+                if count:
+                    metrics.inc("documents", count, stage="ingestion", status=status)
+
+    def report(self):
+        elapsed = max(perf_counter() - self._start, 1e-9)
+        logger.info(
+            f"Ingested {self.docs} documents ({self.failed} failed, "
+            f"{self.skipped} skipped, {self.structured} structured locally) "
+            f"in {elapsed:.1f}s: "
+            f"{self.docs / elapsed:.2f} docs/s, "
+            f"{self.bytes / elapsed / 1024 ** 2:.2f} MB/s downloaded"
+        )
+
+
+class IngestionPipeline:
+    """
+    Download, parse and upload documents concurrently. Downloads run on one thread
+    pool and hand their payload to a second pool that uploads, so that S3 writes
+    overlap with the network reads of the following rows. Parsing is CPU-bound and
+    runs on the process pool of an ExtractionPool (extract_workers=0 parses inline),
+    the payloads are sent to it in chunks of extract_chunksize documents per task.
+    When a journal is given, the outcome of every row is recorded in it. With structure,
+    documents whose heading styles are unambiguous are also written to
+    STRUCTURED_DATA_FOLDER, and generate_json_batch leaves them out of the batch.
+    """
+
+    def __init__(
+        self,
+        workers: int = INGEST_WORKERS,
+        per_host: int = INGEST_PER_HOST_LIMIT,
+        journal: Optional[IngestionJournal] = None,
+        structure: bool = LOCAL_STRUCTURE,
+        extract_workers: int = EXTRACT_WORKERS,
+        extract_chunksize: int = EXTRACT_CHUNKSIZE,
+    ):
+        self.workers = max(1, workers)
+        self.journal = journal
+        self.structure = structure
+        self.extraction = ExtractionPool(extract_workers)
+        # A chunk never holds more than half of the rows in flight, so that the
+        # downloads filling the next one are not blocked
+        self.chunksize = max(1, min(extract_chunksize, self.workers))
+        self._chunk = []
+        self._chunk_lock = threading.Lock()
+        self.stats = IngestionStats()
+        WordDownloader.configure(self.workers, per_host)
+        # Bounds the rows held in memory between download and upload
+        self._in_flight = threading.BoundedSemaphore(2 * self.workers)
+        self._downloads = ThreadPoolExecutor(
+            self.workers, thread_name_prefix="docx-download"
+        )
+        self._processing = ThreadPoolExecutor(
+            self.workers, thread_name_prefix="docx-process"
+        )
+
+    def submit(self, file_id: str, site: str, url: str):
+        self._in_flight.acquire()
+        self._downloads.submit(self._download, file_id, site, url)
+
+    def _download(self, file_id: str, site: str, url: str):
+        word_downloader = WordDownloader(site)
+        try:
+            payload = word_downloader.download_docx(url)
+        except Exception as e:
+            logger.error(f"Download failed {site} {file_id} URL: {url} {e}")
+            self._failed(site, file_id, url, str(e))
+            self._in_flight.release()
+            return
+        self.stats.add(downloaded=len(payload))
+        with self._chunk_lock:
+            self._chunk.append((word_downloader, file_id, url, payload))
+            if len(self._chunk) < self.chunksize:
+                return
+            chunk, self._chunk = self._chunk, []
+        self._processing.submit(self._process_chunk, chunk)
+
+    def _flush_chunk(self):
+        # Rows left in an incomplete chunk once every download is finished
+        with self._chunk_lock:
+            chunk, self._chunk = self._chunk, []
+        if chunk:
+            self._processing.submit(self._process_chunk, chunk)
+
+    @metrics.timed("extract_chunk")
+    def _extract_chunk(self, chunk: list) -> list:
+        documents = [(payload, format_of(url)) for _, _, url, payload in chunk]
+        return self.extraction.paragraphs_many(documents)
+
+    def _process_chunk(self, chunk: list):
+        try:
+            results = self._extract_chunk(chunk)
+        except Exception as e:
+            # The pool itself failed, e.g. a worker was killed
+            logger.error(f"Extraction of {len(chunk)} documents failed {e}")
+            results = [(None, str(e))] * len(chunk)
+        for (word_downloader, file_id, url, _), (paragraphs, error) in zip(
+            chunk, results
+        ):
+            if error is not None:
+                logger.critical(
+                    f"An error occurred {word_downloader.site} URL: {url}{error}"
+                )
+            self._process(word_downloader, file_id, url, paragraphs)
+
+    def _process(self, word_downloader: WordDownloader, file_id, url, paragraphs):
+        site = word_downloader.site
+        try:
+            if paragraphs is None:
+                self._failed(site, file_id, url, "unreadable document")
+                return
+            content = to_text(paragraphs)
+            content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            entry = self.journal.get(file_id, site, url) if self.journal else None
+            if entry is not None and entry["content_hash"] == content_hash:
+                # Same text already in S3, no need to upload it again
+                self.stats.add(skipped=1)
+            elif word_downloader.store(content, file_id):
+                self._failed(site, file_id, url, "upload failed")
+                return
+            else:
+                self.stats.add(done=1)
+                if self.structure:
+                    self._structure(word_downloader, file_id, paragraphs)
+            if self.journal is not None:
+                s3_key = word_downloader.s3_key(file_id)
+                self.journal.record_done(file_id, site, url, content_hash, s3_key)
+        except Exception as e:
+            logger.error(f"Processing failed {site} {file_id} {e}")
+            self._failed(site, file_id, url, str(e))
+        finally:
+            self._in_flight.release()
+
+    def _structure(self, word_downloader: WordDownloader, file_id, paragraphs):
+        # Uploaded after the raw text, so the structured document is the newer one
+        result = structure_paragraphs(paragraphs)
+        if not result.confident:
+            logger.debug(f"{word_downloader.site} {file_id} to batch: {result.reasons}")
+        elif word_downloader.store_structured(result.sections, file_id) == 0:
+            self.stats.add(structured=1)
+
+    def _failed(self, site: str, file_id: str, url: str, error: str):
+        self.stats.add(failed=1)
+        if self.journal is not None:
+            self.journal.record_failed(file_id, site, url, error)
+
+    def close(self):
+        self._downloads.shutdown(wait=True)
+        self._flush_chunk()
+        self._processing.shutdown(wait=True)
+        self.extraction.close()
+        self.stats.report()
+        WordDownloader.bucket.compression.report()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_manifest(path=DATA_DIR / "raw/docx.csv"):
+    """
+    Stream the rows of the docx manifest (id, site, url) without loading it in memory.
+    """
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        for row in csv.reader(csv_file):
+            if len(row) >= 3:
+                yield row[0], row[1], row[2]
+
+
+@metrics.staged("download_raw_data")
+def download_raw_data(
+    workers: int = INGEST_WORKERS,
+    per_host: int = INGEST_PER_HOST_LIMIT,
+    since: Optional[datetime] = None,
+    only_failed: bool = False,
+    journal_path=INGEST_JOURNAL_PATH,
+    structure: bool = LOCAL_STRUCTURE,
+    extract_workers: int = EXTRACT_WORKERS,
+):
+    """
+    Download every document listed in docx.csv and store its text in S3.
+    Rows already recorded as done in the journal are skipped.
+    :param workers: Number of concurrent downloads
+    :param per_host: Maximum number of concurrent requests to the same host
+    :param since: Also re-process rows recorded at or after this time
+    :param only_failed: Only retry rows that failed in a previous run
+    :param journal_path: Location of the ingestion journal
+    :param structure: Structure the unambiguous documents locally, see structure_docx
+    :param extract_workers: Processes parsing the documents, 0 parses inline
+    """
+    journal = IngestionJournal(journal_path)
 
+    try:
+        with IngestionPipeline(
+            workers, per_host, journal, structure, extract_workers
+        ) as pipeline:
+            for id_, site_, url in read_manifest():
+                if journal.should_process(id_, site_, url, since, only_failed):
+                    pipeline.submit(id_, site_, url)
+                else:
+                    pipeline.stats.add(skipped=1)
+        logger.info(f"Journal status: {journal.summary()}")
+    finally:
+        journal.close()
 
-def download_raw_data():
-    files_csv = pd.read_csv(DATA_DIR / "raw/docx.csv", header=None, dtype=str)
+    return pipeline.stats
 
-    for idx, row in files_csv.iterrows():
-        id_ = row[0]
-        site_ = row[1]
-        url = row[2]
-        word_downloader = WordDownloader(site_)
-        content = word_downloader.download_and_read_docx(url)
-        word_downloader.store(content, id_)
 
-    return
+@app.command()
+def main(
+    workers: int = typer.Option(INGEST_WORKERS, help="Concurrent downloads"),
+    per_host: int = typer.Option(INGEST_PER_HOST_LIMIT, help="Requests per host"),
+    since: Optional[datetime] = typer.Option(
+        None, help="Re-process rows recorded at or after this time"
+    ),
+    only_failed: bool = typer.Option(False, help="Only retry failed rows"),
+    structure: bool = typer.Option(
+        LOCAL_STRUCTURE, help="Structure well-styled documents without the batch"
+    ),
+    extract_workers: int = typer.Option(EXTRACT_WORKERS, help="Parsing processes"),
+):
+    download_raw_data(
+        workers,
+        per_host,
+        since,
+        only_failed,
+        structure=structure,
+        extract_workers=extract_workers,
+    )
 
 
 if __name__ == "__main__":
-    download_raw_data()
+    app()
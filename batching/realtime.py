@@ -0,0 +1,323 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import asyncio
+import itertools
+import json
+from time import monotonic
+from typing import IO, TYPE_CHECKING, Iterable, Optional, Tuple
+import typer
+from loguru import logger
+
+# Internal imports
+from config import (
+    OPENAI_API_KEY,
+    BATCH_COMPLETION_WINDOW_HOURS,
+    REALTIME_RPM,
+    REALTIME_TPM,
+    REALTIME_CONCURRENCY,
+    REALTIME_MAX_RETRIES,
+    REALTIME_MAX_REQUESTS,
+)
+from tools.concurrency import backoff_delay
+from batching.prompts import CHARS_PER_TOKEN, prompt_chars
+from tools.metrics import metrics
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+BATCH = "batch"
+REALTIME = "realtime"
+
+app = typer.Typer()
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously at rate_per_minute, holding at most one minute of
+    tokens. Waiters are served in turn, so a large request is not starved by small ones.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """
+        Wait until amount tokens are available and take them. An amount larger than the
+        capacity only waits for a full bucket, and leaves it in debt.
+        """
+        async with self._lock:
+            needed = min(amount, self.capacity)
+            self._refill()
+            while self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount: float) -> None:
+        # Take (or give back) the difference between an estimate and the actual usage
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Requests per minute and tokens per minute limits of the OpenAI account.
+    """
+
+    def __init__(self, rpm: float = REALTIME_RPM, tpm: float = REALTIME_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def acquire(self, tokens: int) -> None:
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+
+def estimate_tokens(chars: int) -> int:
+    """
+    Tokens counted against the limit for a prompt of chars characters: the prompt,
+    and an answer of about the same size, since the model restates the text as JSON.
+    """
+    return 2 * (chars // CHARS_PER_TOKEN + 1)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def _retryable(error: Exception) -> bool:
+    # Rate limited, server errors, and connection failures or timeouts
+    from openai import APIConnectionError
+
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (APIConnectionError, asyncio.TimeoutError))
+
+
+def _retry_after(error: Exception) -> float:
+    # Seconds requested by the Retry-After header of a 429, 0 when there is none
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+def realtime_seconds(
+    n_requests: int,
+    n_tokens: int,
+    rpm: float = REALTIME_RPM,
+    tpm: float = REALTIME_TPM,
+) -> float:
+    """
+    :return: Shortest duration of a job sent in real time, set by the rate limits
+    """
+    return 60.0 * max(n_requests / rpm, n_tokens / tpm)
+
+
+def choose_mode(
+    n_requests: int,
+    n_tokens: int,
+    deadline: Optional[float] = None,
+    max_requests: int = REALTIME_MAX_REQUESTS,
+    rpm: float = REALTIME_RPM,
+    tpm: float = REALTIME_TPM,
+) -> str:
+    """
+    Batch or real time for a job. Small jobs are sent in real time, they would wait
+    for a batch slot for nothing. A job with a deadline shorter than the completion
+    window of the batches is sent in real time if the rate limits let it finish in
+    time. Everything else goes through the batch API, at half the price.
+    :param n_requests: Number of requests of the job
+    :param n_tokens: Estimated tokens of the job, see estimate_tokens
+    :param deadline: Seconds within which the results are needed
+    :return: BATCH or REALTIME
+    """
+    if n_requests <= max_requests:
+        return REALTIME
+    if deadline is None or deadline >= BATCH_COMPLETION_WINDOW_HOURS * 3600:
+        return BATCH
+    needed = realtime_seconds(n_requests, n_tokens, rpm, tpm)
+    if needed <= deadline:
+        return REALTIME
+    logger.warning(
+        f"{n_requests} requests need at least {needed / 3600:.1f}h in real time, "
+        f"more than the deadline of {deadline / 3600:.1f}h: sent as a batch"
+    )
+    return BATCH
+
+
+class RealtimeRunner:
+    """
+    Send batch input lines (see BatchManager._build_request) to the chat completions
+    endpoint, within the rate limits and with a bounded number of requests in flight.
+    Requests rate limited or failed on the server side are retried with a jittered
+    backoff. Answers and failures are written as the lines of a batch output and error
+    file, so that the post-processing reads them as any batch result.
+    """
+
+    def __init__(
+        self,
+        client: Optional["AsyncOpenAI"] = None,
+        rpm: float = REALTIME_RPM,
+        tpm: float = REALTIME_TPM,
+        concurrency: int = REALTIME_CONCURRENCY,
+        max_retries: int = REALTIME_MAX_RETRIES,
+    ):
+        """
+        :param client: Async OpenAI client, by default one is created from OPENAI_API_KEY
+                       for each run and closed at its end
+        :param rpm: Requests per minute
+        :param tpm: Tokens per minute, prompts and answers
+        :param concurrency: Maximum number of requests in flight
+        :param max_retries: Retries of a rate limited or failed request
+        """
+        self.client = client
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self._ids = itertools.count()
+
+    async def _send(self, request: dict, limiter: RateLimiter) -> Tuple[dict, bool]:
+        body = request["body"]
+        estimate = estimate_tokens(prompt_chars(body))
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(estimate)
+            metrics.inc("openai_requests", operation="chat.completions.create")
+            try:
+                completion = await self.client.chat.completions.create(**body)
+            except Exception as e:
+                if attempt < self.max_retries and _retryable(e):
+                    self.retries += 1
+                    metrics.inc("openai_retries", status=_status_code(e) or "error")
+                    delay = max(
+                        backoff_delay(attempt, base=1.0, cap=60.0), _retry_after(e)
+                    )
+                    logger.debug(f"{request['custom_id']}: {e}, retry in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                return self._error_line(request, e), False
+            usage = getattr(completion, "usage", None)
+            if usage is not None:
+                limiter.tokens.adjust(usage.total_tokens - estimate)
+            return self._output_line(request, completion), True
+
+    def _output_line(self, request: dict, completion) -> dict:
+        return {
+            "id": f"realtime_req_{next(self._ids)}",
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "request_id": getattr(completion, "_request_id", None),
+                "body": completion.model_dump(),
+            },
+            "error": None,
+        }
+
+    def _error_line(self, request: dict, error: Exception) -> dict:
+        status = _status_code(error)
+        return {
+            "id": f"realtime_req_{next(self._ids)}",
+            "custom_id": request["custom_id"],
+            "response": (
+                None
+                if status is None
+                else {"status_code": status, "body": {"error": str(error)}}
+            ),
+            "error": {"code": type(error).__name__, "message": str(error)},
+        }
+
+    async def run(self, lines: Iterable[str], output: IO[bytes], errors: IO[bytes]):
+        """
+        Send every request and write its answer as soon as it is received.
+        :param lines: Batch input lines, read as they are needed
+        :param output: Receives the lines of the answered requests
+        :param errors: Receives the lines of the requests that failed
+        """
+        if self.client is None:
+            from openai import AsyncOpenAI
+
+            # Owned by this run, its connection pool is closed with it
+            async with AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0) as client:
+                self.client = client
+                try:
+                    return await self.run(lines, output, errors)
+                finally:
+                    self.client = None
+        limiter = RateLimiter(self.rpm, self.tpm)
+        lines = iter(lines)
+
+        async def worker():
+            # Each worker takes the next line of the shared iterator when it is free
+            for line in lines:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                result, ok = await self._send(request, limiter)
+                file = output if ok else errors
+                file.write((json.dumps(result, ensure_ascii=False) + "\n").encode())
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                    logger.warning(f"{request['custom_id']}: {result['error']}")
+
+        start = monotonic()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        elapsed = max(monotonic() - start, 1e-9)
+        metrics.inc("documents", self.completed, stage="realtime", status="ok")
+        metrics.inc("documents", self.failed, stage="realtime", status="error")
+        logger.info(
+            f"{self.completed} requests answered in real time in {elapsed:.1f}s "
+            f"({60 * (self.completed + self.failed) / elapsed:.0f}/min), "
+            f"{self.failed} failed, {self.retries} retries"
+        )
+
+    def send(self, lines: Iterable[str], output: IO[bytes], errors: IO[bytes]) -> None:
+        # Synchronous entry point, see run
+        asyncio.run(self.run(lines, output, errors))
+
+
+@app.command()
+def main(
+    batch_name: str,
+    mode: str = typer.Option("auto", help="auto, batch or realtime"),
+    deadline_hours: float = typer.Option(None, help="Results needed within"),
+    post_process: bool = typer.Option(True, help="Write the structured documents"),
+):
+    # Imported here, create_batch imports this module
+    from batching.create_batch import BatchManager
+    from batching.post_process import process_batch_output
+
+    batch_manager = BatchManager(batch_name)
+    batch_manager.generate_json_batch()
+    deadline = None if deadline_hours is None else deadline_hours * 3600
+    mode = batch_manager.submit(deadline, mode)
+    if mode == BATCH and batch_manager.group_file:
+        batch_manager.retrieve_results()
+    if post_process and batch_manager.group_file:
+        process_batch_output(batch_manager.job_name)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,117 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import re
+from typing import Iterable, List, NamedTuple, Optional
+
+# Internal imports
+from config import LOCAL_STRUCTURE_MAX_LEVEL, LOCAL_STRUCTURE_MAX_SECTION_CHARS
+from batching.extract_text_from_docx import DocxParagraph
+from batching.post_process import InvalidResult, validate_sections
+
+# Body text that reads like a heading typed by hand: "2. Scope", "3.1 Definitions"
+NUMBERED_HEADING = re.compile(r"^\d+(\.\d+)*\.?\s+\S.{0,80}$")
+
+
+class LocalStructure(NamedTuple):
+    sections: List[dict]
+    reasons: List[str]  # why the document is ambiguous, empty when it is not
+
+    @property
+    def confident(self) -> bool:
+        return not self.reasons
+
+
+def _content_item(text: str, urls: Iterable[str]) -> dict:
+    # Same convention as the prompt: url for a single link, urls for several
+    urls = list(urls)
+    return {
+        "text": text,
+        "url": urls[0] if len(urls) == 1 else None,
+        "urls": urls if len(urls) > 1 else None,
+    }
+
+
+def structure_paragraphs(
+    paragraphs: Iterable[DocxParagraph],
+    max_level: int = LOCAL_STRUCTURE_MAX_LEVEL,
+    max_section_chars: int = LOCAL_STRUCTURE_MAX_SECTION_CHARS,
+) -> LocalStructure:
+    """
+    Build the sections that the batch prompt asks the model for (h_title, main_title,
+    level, content) from the heading styles of a docx, and list what makes the result
+    uncertain. Only documents without any reason should skip the model.
+    :param paragraphs: Paragraphs of the document, see iter_docx_paragraphs
+    :param max_level: Deepest heading level of a section (H1 to H4 in the prompt)
+    :param max_section_chars: Longer sections probably hide unstyled sub-headings
+    :return: The sections and the reasons why they may differ from the model's
+    """
+    sections, reasons = [], []
+    title: Optional[str] = None
+    leading = False
+    previous_level = None
+    section_chars = 0
+
+    def reason(text: str):
+        if text not in reasons:
+            reasons.append(text)
+
+    for paragraph in paragraphs:
+        text = paragraph.text.strip()
+        if paragraph.level is None:
+            if not text:
+                continue
+            if paragraph.style == "Title" and title is None and not sections:
+                title = text
+                continue
+            if not sections:
+                leading = True
+                continue
+            if NUMBERED_HEADING.match(text) and not text.endswith((".", ":", ";")):
+                reason("numbered paragraph without heading style")
+            sections[-1]["content"].append(_content_item(text, paragraph.urls))
+            section_chars += len(text)
+            if section_chars > max_section_chars:
+                reason(f"section longer than {max_section_chars} characters")
+            continue
+
+        if not text:
+            reason("empty heading")
+            continue
+        if paragraph.level > max_level:
+            reason(f"heading deeper than H{max_level}")
+            continue
+        if previous_level is not None and paragraph.level > previous_level + 1:
+            reason("skipped heading level")
+        previous_level = paragraph.level
+        section_chars = 0
+        sections.append(
+            {
+                "h_title": text,
+                "main_title": None,
+                "level": paragraph.level,
+                "content": [],
+            }
+        )
+
+    if not sections:
+        return LocalStructure([], ["no heading styles"])
+    if leading:
+        reason("text before the first heading")
+    if sections[0]["level"] != min(section["level"] for section in sections):
+        reason("first heading is not the highest level")
+
+    # The highest-level title of the article: the Title paragraph, else the first H1
+    if title is None:
+        top_level = min(section["level"] for section in sections)
+        title = next(s["h_title"] for s in sections if s["level"] == top_level)
+    for section in sections:
+        section["main_title"] = title
+
+    try:
+        sections = validate_sections(sections)
+    except InvalidResult as e:
+        reason(e.reason)
+    return LocalStructure(sections, reasons)
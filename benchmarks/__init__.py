@@ -0,0 +1,4 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
@@ -0,0 +1,157 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import random
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from typing import Iterator, Tuple
+from xml.sax.saxutils import escape
+
+BASE_URL = "https://docs.example.com"
+SITES = ("FR", "UK")
+WORDS = (
+    "stock safety supplier demand forecast lead time order inventory service level "
+    "warehouse replenishment cost quantity review period variability customer "
+    "capacity planning production schedule shipment carrier tariff margin"
+).split()
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+HYPERLINK = f"{R_NS}/hyperlink"
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    "</Types>"
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<Relationships xmlns="{PKG_RELS}">'
+    f'<Relationship Id="rId1" Type="{R_NS}/officeDocument" Target="word/document.xml"/>'
+    "</Relationships>"
+)
+
+
+def _style(style_id: str, name: str, outline: int = None, default: bool = False):
+    default_attr = ' w:default="1"' if default else ""
+    outline_xml = f'<w:pPr><w:outlineLvl w:val="{outline}"/></w:pPr>' if outline else ""
+    return (
+        f'<w:style w:type="paragraph"{default_attr} w:styleId="{style_id}">'
+        f'<w:name w:val="{name}"/>{outline_xml}</w:style>'
+    )
+
+
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<w:styles xmlns:w="{W_NS}">'
+    + _style("Normal", "Normal", default=True)
+    + _style("Title", "Title")
+    + "".join(_style(f"Heading{n}", f"heading {n}", n - 1) for n in range(1, 5))
+    + "</w:styles>"
+)
+
+
+def _paragraph(text: str, style: str = None, link: str = None) -> str:
+    style_xml = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    run = f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+    if link:
+        run += f'<w:hyperlink r:id="{link}"><w:r><w:t>link</w:t></w:r></w:hyperlink>'
+    return f"<w:p>{style_xml}{run}</w:p>"
+
+
+def make_docx(
+    index: int, seed: int = 0, ambiguous_rate: float = 0.3, max_sections: int = 8
+) -> bytes:
+    """
+    Build a small but well-formed docx: a title, H1-H3 sections, body paragraphs and
+    hyperlinks. A share of the documents (ambiguous_rate) starts with unstyled text, so
+    that the local structurer sends them to the batch.
+    :param index: Number of the document, the same index always gives the same bytes
+    :return: The docx file content
+    """
+    rng = random.Random(f"{seed}-{index}")
+
+    def sentence(n_words: int) -> str:
+        return " ".join(rng.choices(WORDS, k=n_words)).capitalize()
+
+    links, body = [], [_paragraph(f"Document {index}", "Title")]
+    if rng.random() < ambiguous_rate:
+        body.append(_paragraph(sentence(25) + "."))
+    level = 1
+    for _ in range(rng.randint(2, max_sections)):
+        body.append(_paragraph(sentence(4), f"Heading{level}"))
+        for _ in range(rng.randint(1, 6)):
+            link = None
+            if rng.random() < 0.2:
+                link = f"rId{len(links) + 2}"
+                links.append(f"{BASE_URL}/ref/{rng.randint(0, 10 ** 6)}")
+            body.append(_paragraph(sentence(rng.randint(10, 60)) + ".", link=link))
+        level = rng.randint(1, min(level + 1, 3))
+
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:body>'
+        + "".join(body)
+        + "<w:sectPr/></w:body></w:document>"
+    )
+    document_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<Relationships xmlns="{PKG_RELS}">'
+        f'<Relationship Id="rId1" Type="{R_NS}/styles" Target="styles.xml"/>'
+        + "".join(
+            f'<Relationship Id="rId{i + 2}" Type="{HYPERLINK}" '
+            f'Target="{escape(url)}" TargetMode="External"/>'
+            for i, url in enumerate(links)
+        )
+        + "</Relationships>"
+    )
+
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("word/document.xml", document)
+        archive.writestr("word/_rels/document.xml.rels", document_rels)
+        archive.writestr("word/styles.xml", STYLES)
+    return buffer.getvalue()
+
+
+def corpus_rows(
+    n_docs: int, duplicate_rate: float = 0.0, seed: int = 0
+) -> Iterator[Tuple[str, str, str]]:
+    """
+    Rows of a synthetic docx manifest (id, site, url), like data/raw/docx.csv.
+    :param duplicate_rate: Share of the rows serving the document of an earlier row,
+                           as the same article published on several sites
+    """
+    rng = random.Random(f"{seed}-rows")
+    for index in range(n_docs):
+        site = SITES[index % len(SITES)]
+        document = index
+        if index and rng.random() < duplicate_rate:
+            document = rng.randrange(index)
+        yield str(index), site, f"{BASE_URL}/{site}/{document}.docx"
+
+
+def fetch_document(url: str, seed: int = 0, ambiguous_rate: float = 0.3) -> bytes:
+    # Content served for a URL of corpus_rows, generated on demand
+    index = int(url.rsplit("/", 1)[-1].split(".")[0])
+    return make_docx(index, seed, ambiguous_rate)
+
+
+def write_corpus(folder: Path, n_docs: int, seed: int = 0) -> None:
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    for index in range(n_docs):
+        (folder / f"synthetic_{index:06d}.docx").write_bytes(make_docx(index, seed))
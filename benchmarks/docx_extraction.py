@@ -0,0 +1,89 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import random
+from pathlib import Path
+from time import perf_counter
+import docx
+import typer
+from loguru import logger
+
+# Internal imports
+from config import DATA_DIR
+from batching.extract_text_from_docx import extract_text_from_docx
+
+app = typer.Typer()
+
+WORDS = (
+    "stock safety supplier demand forecast lead time order inventory service level "
+    "warehouse replenishment cost quantity review period variability customer"
+).split()
+
+
+def generate_corpus(folder: Path, n_files: int = 50, seed: int = 0):
+    # Documents with headings, paragraphs, tabs, line breaks and a table
+    rng = random.Random(seed)
+    folder.mkdir(parents=True, exist_ok=True)
+    for idx in range(n_files):
+        document = docx.Document()
+        document.add_heading(f"Document {idx}", 0)
+        for section in range(rng.randint(5, 30)):
+            document.add_heading(" ".join(rng.choices(WORDS, k=4)), rng.randint(1, 3))
+            for _ in range(rng.randint(2, 10)):
+                paragraph = document.add_paragraph(" ".join(rng.choices(WORDS, k=60)))
+                run = paragraph.add_run("\t" + " ".join(rng.choices(WORDS, k=5)))
+                run.add_break()
+                run.add_text(" ".join(rng.choices(WORDS, k=10)))
+            if section % 5 == 0:
+                table = document.add_table(rows=3, cols=3)
+                table.cell(0, 0).text = " ".join(rng.choices(WORDS, k=3))
+        document.save(folder / f"sample_{idx:04d}.docx")
+
+
+def python_docx_text(path) -> str:
+    # Reference implementation, the extraction before the streaming parser
+    return "\n".join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+
+
+def _time(func, paths, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for path in paths:
+            func(path)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+@app.command()
+def main(
+    folder: Path = typer.Option(DATA_DIR / "benchmarks/docx", help="Folder of .docx"),
+    n_files: int = typer.Option(50, help="Files generated if the folder is empty"),
+    repeat: int = typer.Option(3, help="Runs per extractor, the best one is kept"),
+):
+    paths = sorted(folder.glob("*.docx"))
+    if not paths:
+        logger.info(f"No .docx in {folder}, generating {n_files} samples")
+        generate_corpus(folder, n_files)
+        paths = sorted(folder.glob("*.docx"))
+
+    # The fast extractor must return exactly the text of python-docx
+    mismatches = [
+        p.name for p in paths if extract_text_from_docx(p) != python_docx_text(p)
+    ]
+    if mismatches:
+        logger.error(f"Different text for {mismatches}")
+        raise typer.Exit(1)
+
+    reference = _time(python_docx_text, paths, repeat)
+    streamed = _time(extract_text_from_docx, paths, repeat)
+    logger.info(
+        f"{len(paths)} files, identical text. python-docx: {reference:.3f}s, "
+        f"zip+iterparse: {streamed:.3f}s, speedup x{reference / streamed:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    app()
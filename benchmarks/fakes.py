@@ -0,0 +1,413 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from io import BytesIO
+from time import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+
+def _client_error(code: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in of the boto3 S3 client, covering the calls made by S3Manager.
+    Thread-safe, and every call is counted in requests by operation name.
+    """
+
+    PAGE_SIZE = 1000
+
+    def __init__(self):
+        self.objects: Dict[str, dict] = {}
+        self.requests = Counter()
+        self._uploads: Dict[str, dict] = {}
+        self._upload_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _count(self, operation: str) -> None:
+        with self._lock:
+            self.requests[operation] += 1
+
+    def _store(self, key: str, body: bytes, **metadata) -> None:
+        obj = {
+            "Body": bytes(body),
+            "ETag": f'"{hashlib.md5(body).hexdigest()}"',
+            "LastModified": datetime.now(timezone.utc),
+            **{k: v for k, v in metadata.items() if v is not None},
+        }
+        with self._lock:
+            self.objects[key] = obj
+
+    def _get(self, key: str, operation: str) -> dict:
+        with self._lock:
+            obj = self.objects.get(key)
+        if obj is None:
+            raise _client_error(
+                "NoSuchKey" if operation == "GetObject" else "404", operation
+            )
+        return obj
+
+    @staticmethod
+    def _metadata(obj: dict) -> dict:
+        return {k: v for k, v in obj.items() if k != "Body"}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, ContentEncoding=None):
+        self._count("PutObject")
+        self._store(Key, Body, ContentType=ContentType, ContentEncoding=ContentEncoding)
+        return {"ETag": self.objects[Key]["ETag"]}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        self._count("UploadFileobj")
+        self._store(Key, Fileobj.read(), **(ExtraArgs or {}))
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self._count("GetObject")
+        obj = self._get(Key, "GetObject")
+        if IfNoneMatch is not None and IfNoneMatch == obj["ETag"]:
+            raise _client_error("304", "GetObject")
+        body = obj["Body"]
+        return {
+            **self._metadata(obj),
+            "Body": StreamingBody(BytesIO(body), len(body)),
+            "ContentLength": len(body),
+        }
+
+    def head_object(self, Bucket, Key):
+        self._count("HeadObject")
+        obj = self._get(Key, "HeadObject")
+        return {**self._metadata(obj), "ContentLength": len(obj["Body"])}
+
+    def download_file(self, Bucket, Key, Filename, Config=None):
+        self._count("DownloadFile")
+        with open(Filename, "wb") as file:
+            file.write(self._get(Key, "GetObject")["Body"])
+
+    def delete_object(self, Bucket, Key):
+        self._count("DeleteObject")
+        with self._lock:
+            self.objects.pop(Key, None)
+
+    def delete_objects(self, Bucket, Delete):
+        self._count("DeleteObjects")
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.objects.pop(obj["Key"], None)
+        return {}
+
+    def copy_object(self, Bucket, CopySource, Key):
+        self._count("CopyObject")
+        source = self._get(CopySource["Key"], "CopyObject")
+        with self._lock:
+            self.objects[Key] = {**source, "LastModified": datetime.now(timezone.utc)}
+
+    def create_multipart_upload(
+        self, Bucket, Key, ContentType=None, ContentEncoding=None
+    ):
+        self._count("CreateMultipartUpload")
+        upload_id = f"upload-{next(self._upload_ids)}"
+        with self._lock:
+            self._uploads[upload_id] = {
+                "parts": {},
+                "metadata": {
+                    "ContentType": ContentType,
+                    "ContentEncoding": ContentEncoding,
+                },
+            }
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._count("UploadPart")
+        with self._lock:
+            self._uploads[UploadId]["parts"][PartNumber] = bytes(Body)
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._count("CompleteMultipartUpload")
+        with self._lock:
+            upload = self._uploads.pop(UploadId)
+        body = b"".join(
+            upload["parts"][part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+        self._store(Key, body, **upload["metadata"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._count("AbortMultipartUpload")
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+
+    def get_paginator(self, operation_name: str):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=""):
+                with fake._lock:
+                    keys = sorted(k for k in fake.objects if k.startswith(Prefix))
+                for start in range(0, len(keys), fake.PAGE_SIZE):
+                    fake._count("ListObjectsV2")
+                    contents = []
+                    for key in keys[start : start + fake.PAGE_SIZE]:
+                        obj = fake.objects.get(key)
+                        if obj is not None:
+                            contents.append(
+                                {
+                                    "Key": key,
+                                    "Size": len(obj["Body"]),
+                                    "ETag": obj["ETag"],
+                                    "LastModified": obj["LastModified"],
+                                }
+                            )
+                    yield {"Contents": contents}
+                if not keys:
+                    fake._count("ListObjectsV2")
+                    yield {}
+
+        return Paginator()
+
+
+def _echo_model(custom_id: str, body: dict) -> dict:
+    # Answer of the fake model: the first line of the text as the only section
+    prompt = body["messages"][-1]["content"]
+    text = prompt.split("### Text to convert:", 1)[-1].strip()
+    lines = [line.strip() for line in text.splitlines() if line.strip()] or [custom_id]
+    sections = [
+        {
+            "h_title": lines[0],
+            "main_title": lines[0],
+            "level": 1,
+            "content": [
+                {"text": line, "url": None, "urls": None} for line in lines[1:]
+            ],
+        }
+    ]
+    return {"sections": sections}
+
+
+class FakeOpenAI:
+    """
+    Stand-in of the OpenAI files and batches APIs used by BatchManager. A batch goes
+    through validating, in_progress and finalizing on successive retrieve calls, then
+    completes with one answer per request, produced by model(custom_id, body).
+    A deterministic share of the requests (error_rate) fails with a 500 status.
+    """
+
+    STATUSES = ("validating", "in_progress", "finalizing", "completed")
+
+    def __init__(
+        self, model: Callable[[str, dict], dict] = _echo_model, error_rate: float = 0
+    ):
+        self.model = model
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, dict] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.files = _FakeFiles(self)
+        self.batches = _FakeBatches(self)
+
+    def _count(self, operation: str) -> None:
+        with self._lock:
+            self.requests[operation] += 1
+
+    def _new_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}-{next(self._ids)}"
+
+    def _failed(self, custom_id: str) -> bool:
+        digest = hashlib.sha256(custom_id.encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") / 2**32 < self.error_rate
+
+    def _run(self, batch_id: str) -> None:
+        # Build the output and error files of a batch from its input file
+        batch_ = self._batches[batch_id]
+        output, errors = [], []
+        for line in self._files[batch_["input_file_id"]].splitlines():
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+            if self._failed(custom_id):
+                response = {"status_code": 500, "body": {"error": "server_error"}}
+                errors.append({"custom_id": custom_id, "response": response})
+                continue
+            content = json.dumps(self.model(custom_id, request["body"]))
+            choice = {"message": {"content": content}, "finish_reason": "stop"}
+            response = {"status_code": 200, "body": {"choices": [choice]}}
+            output.append({"custom_id": custom_id, "response": response, "error": None})
+        for name, rows in (("output_file_id", output), ("error_file_id", errors)):
+            if rows:
+                file_id = self._new_id("file")
+                lines = "".join(json.dumps(row) + "\n" for row in rows)
+                self._files[file_id] = lines.encode("utf-8")
+                batch_[name] = file_id
+        batch_["counts"] = (len(output), len(errors))
+
+
+class _FakeFiles:
+    def __init__(self, api: FakeOpenAI):
+        self._api = api
+
+    def create(self, file, purpose):
+        self._api._count("files.create")
+        file_id = self._api._new_id("file")
+        self._api._files[file_id] = file.read()
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def content(self, file_id):
+        self._api._count("files.content")
+        return SimpleNamespace(content=self._api._files[file_id])
+
+    @property
+    def with_streaming_response(self):
+        api = self._api
+
+        class StreamingFiles:
+            @contextmanager
+            def content(self, file_id):
+                api._count("files.content")
+                data = api._files[file_id]
+                yield SimpleNamespace(
+                    iter_bytes=lambda size: (
+                        data[i : i + size] for i in range(0, len(data), size)
+                    )
+                )
+
+        return StreamingFiles()
+
+
+class _FakeBatches:
+    def __init__(self, api: FakeOpenAI):
+        self._api = api
+
+    def create(self, input_file_id, endpoint, completion_window, metadata=None):
+        self._api._count("batches.create")
+        batch_id = self._api._new_id("batch")
+        self._api._batches[batch_id] = {
+            "input_file_id": input_file_id,
+            "step": 0,
+            "output_file_id": None,
+            "error_file_id": None,
+            "counts": (0, 0),
+            "created_at": int(time()),
+            "in_progress_at": None,
+            "completed_at": None,
+        }
+        return self.retrieve(batch_id, count=False)
+
+    def retrieve(self, batch_id, count: bool = True):
+        if count:
+            self._api._count("batches.retrieve")
+        batch_ = self._api._batches[batch_id]
+        status = FakeOpenAI.STATUSES[min(batch_["step"], 3)]
+        if status == "in_progress" and batch_["in_progress_at"] is None:
+            batch_["in_progress_at"] = int(time())
+        if status == "completed" and batch_["output_file_id"] is None:
+            self._api._run(batch_id)
+            batch_["completed_at"] = int(time())
+        batch_["step"] += 1
+        completed, failed = batch_["counts"]
+        return SimpleNamespace(
+            id=batch_id,
+            status=status,
+            output_file_id=batch_["output_file_id"],
+            error_file_id=batch_["error_file_id"],
+            created_at=batch_["created_at"],
+            in_progress_at=batch_["in_progress_at"],
+            completed_at=batch_["completed_at"],
+            request_counts=SimpleNamespace(
+                total=completed + failed, completed=completed, failed=failed
+            ),
+        )
+
+
+class FakeStatusError(Exception):
+    """
+    API error with an HTTP status, as raised by the OpenAI client.
+    """
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={})
+
+
+class FakeAsyncOpenAI:
+    """
+    Async view of a FakeOpenAI: batches for the BatchTracker, and chat completions for
+    the real-time mode. The requests failing in a batch (error_rate) always fail with a
+    500 status, and a random share of the calls (rate_limit_rate) is rate limited.
+    """
+
+    def __init__(self, api: FakeOpenAI, rate_limit_rate: float = 0, seed: int = 0):
+        random_ = random.Random(seed)
+
+        class Batches:
+            async def retrieve(self, batch_id):
+                await asyncio.sleep(0)
+                return api.batches.retrieve(batch_id)
+
+        class Completions:
+            async def create(self, model, messages, **kwargs):
+                api._count("chat.completions.create")
+                await asyncio.sleep(0)
+                if random_.random() < rate_limit_rate:
+                    raise FakeStatusError(429, "rate_limit_exceeded")
+                content = messages[-1]["content"]
+                custom_id = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                if api._failed(custom_id):
+                    raise FakeStatusError(500, "server_error")
+                answer = json.dumps(api.model(custom_id, {"messages": messages}))
+                choice = {"message": {"content": answer}, "finish_reason": "stop"}
+                tokens = (len(content) + len(answer)) // 4
+                completion = {
+                    "id": api._new_id("chatcmpl"),
+                    "model": model,
+                    "choices": [choice],
+                    "usage": {"total_tokens": tokens},
+                }
+                return SimpleNamespace(
+                    usage=SimpleNamespace(total_tokens=tokens),
+                    model_dump=lambda: completion,
+                )
+
+        self.batches = Batches()
+        self.chat = SimpleNamespace(completions=Completions())
+
+
+class FakeHttpSession:
+    """
+    Stand-in of the requests.Session of WordDownloader, serving documents from a
+    function of the URL instead of the network.
+    """
+
+    def __init__(self, fetch: Callable[[str], Optional[bytes]]):
+        self.fetch = fetch
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, url: str, timeout: float = None):
+        with self._lock:
+            self.requests["GET"] += 1
+        content = self.fetch(url)
+        status_code = 404 if content is None else 200
+
+        def raise_for_status():
+            if status_code != 200:
+                raise IOError(f"{status_code} for {url}")
+
+        return SimpleNamespace(
+            content=content, status_code=status_code, raise_for_status=raise_for_status
+        )
@@ -0,0 +1,105 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+import typer
+from loguru import logger
+
+# Internal imports
+from config import DATA_DIR, PROJ_ROOT
+
+app = typer.Typer()
+
+RESULTS_FILE = DATA_DIR / "benchmarks" / "import_time.jsonl"
+ENTRY_POINTS = (
+    "config",
+    "tools",
+    "batching.batch_tracker",
+    "batching.create_batch",
+    "batching.post_process",
+    "batching.read_word_online",
+    "batching.extraction",
+)
+# Slow to import and only needed once a client is actually used
+DEFERRED = ("openai", "boto3", "pandas", "requests")
+
+
+def import_time(module: str) -> Dict[str, object]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+    :return: Cumulative import time of the module in seconds, the deferred packages it
+             loaded anyway, and its slowest top-level dependencies
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJ_ROOT,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative, dependencies = {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        if not total.strip().isdigit():  # header line
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        cumulative[name] = int(total) / 1e6
+        # Imports are listed before their importer: the direct dependencies of the
+        # module are the first level entries that follow the previous top-level import
+        if depth == 0 and name != module:
+            dependencies = {}
+        elif depth == 1:
+            dependencies[name] = int(total) / 1e6
+    slowest = sorted(dependencies.items(), key=lambda item: -item[1])[:5]
+    return {
+        "module": module,
+        "seconds": cumulative.get(module),
+        "deferred_loaded": [name for name in DEFERRED if name in cumulative],
+        "slowest": dict(slowest),
+    }
+
+
+@app.command()
+def main(
+    modules: str = typer.Option(",".join(ENTRY_POINTS), help="Comma separated"),
+    repeat: int = typer.Option(3, help="Best of n runs"),
+    budget: float = typer.Option(None, help="Fail above this many seconds"),
+    results_file: Path = typer.Option(RESULTS_FILE, help="JSONL history of the runs"),
+):
+    records: List[dict] = []
+    for module in modules.split(","):
+        runs = [import_time(module) for _ in range(max(1, repeat))]
+        best = min(runs, key=lambda run: run["seconds"])
+        records.append(best)
+        logger.info(
+            f"{module:<28} {best['seconds'] * 1000:8.1f} ms "
+            f"deferred loaded: {best['deferred_loaded'] or '-'}"
+        )
+
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    run_at = datetime.now().isoformat(timespec="seconds")
+    with open(results_file, "a") as file:
+        for record in records:
+            record = {"run_at": run_at, "python": sys.version.split()[0], **record}
+            file.write(json.dumps(record) + "\n")
+
+    over = [r["module"] for r in records if budget and r["seconds"] > budget]
+    if over:
+        logger.error(f"Import time above {budget}s: {over}")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,256 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import json
+import os
+import platform
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+from typing import List
+import typer
+from loguru import logger
+
+# Internal imports
+from batching.create_batch import BatchManager
+from batching.post_process import ResultsProcessor
+from batching.read_word_online import IngestionPipeline, WordDownloader
+from config import (
+    DATA_DIR,
+    INGEST_WORKERS,
+    INGEST_PER_HOST_LIMIT,
+    INGEST_JOURNAL_PATH,
+    EXTRACT_WORKERS,
+)
+from tools import IngestionJournal
+from tools.aws_clients import register_client
+from tools.metrics import metrics
+from tools.resources import format_bytes, peak_memory_bytes
+from benchmarks.corpus import corpus_rows, fetch_document
+from benchmarks.fakes import FakeAsyncOpenAI, FakeHttpSession, FakeOpenAI, FakeS3Client
+
+app = typer.Typer()
+
+RESULTS_FILE = DATA_DIR / "benchmarks" / "pipeline.jsonl"
+
+
+@contextmanager
+def isolated_settings(directory: Path):
+    """
+    Point every local state of the pipeline (shards, manifests, journal, index,
+    caches) to directory, for the processes started within the block: their settings
+    are read from the environment when they import config.
+    """
+    overrides = {
+        "DATA_DIR": str(directory),
+        "INGEST_JOURNAL_PATH": str(directory / "raw" / "ingestion_journal.db"),
+        "BATCH_INDEX_PATH": str(directory / "batch_ids" / "batch_index.db"),
+        "S3_MANIFEST_DIR": str(directory / "manifests"),
+        "S3_CACHE_DIR": "",
+    }
+    previous = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        yield directory
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+class StageRecorder:
+    """
+    Time the stages of a run and record, for each one, its throughput, the peak RSS
+    so far and the requests it sent to every fake service.
+    """
+
+    def __init__(self, services: dict):
+        self.services = services  # name -> Counter of requests
+        self.stages: List[dict] = []
+
+    def _snapshot(self) -> dict:
+        return {name: dict(counter) for name, counter in self.services.items()}
+
+    def run(self, stage: str, func, docs=None):
+        """
+        :param func: Stage to run, returns its number of documents unless docs is given
+        """
+        before = self._snapshot()
+        start = perf_counter()
+        result = func()
+        elapsed = max(perf_counter() - start, 1e-9)
+        docs = result if docs is None else docs
+        after = self._snapshot()
+        requests = {
+            name: {
+                operation: count - before[name].get(operation, 0)
+                for operation, count in counts.items()
+                if count - before[name].get(operation, 0)
+            }
+            for name, counts in after.items()
+        }
+        self.stages.append(
+            {
+                "stage": stage,
+                "docs": docs,
+                "seconds": round(elapsed, 3),
+                "docs_per_s": round(docs / elapsed, 1),
+                "peak_rss": peak_memory_bytes(),
+                "peak_rss_children": peak_memory_bytes(children=True),
+                "requests": requests,
+            }
+        )
+        return result
+
+
+def run_pipeline(
+    n_docs: int,
+    workers: int = INGEST_WORKERS,
+    extract_workers: int = EXTRACT_WORKERS,
+    error_rate: float = 0.02,
+    ambiguous_rate: float = 0.3,
+    duplicate_rate: float = 0.1,
+    seed: int = 0,
+    log_level: str = "WARNING",
+    with_metrics: bool = False,
+) -> List[dict]:
+    """
+    Run ingestion, batch build, result retrieval and post-processing on n_docs
+    synthetic documents, against in-memory S3, HTTP and OpenAI stand-ins.
+    Meant to run in a fresh process started within isolated_settings, whose shared
+    clients are the fakes and whose files are written in a temporary directory.
+    :param with_metrics: Record the metrics of tools.metrics, to measure their overhead
+    :return: One record per stage
+    """
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    metrics.configure(with_metrics, json_log=None, prometheus_file=None)
+
+    s3 = FakeS3Client()
+    register_client(s3, "s3")
+    openai = FakeOpenAI(error_rate=error_rate)
+    http = FakeHttpSession(
+        partial(fetch_document, seed=seed, ambiguous_rate=ambiguous_rate)
+    )
+    recorder = StageRecorder({"s3": s3.requests, "openai": openai.requests})
+    recorder.services["http"] = http.requests
+
+    batch_manager = None
+
+    def ingest():
+        journal = IngestionJournal(INGEST_JOURNAL_PATH)
+        with IngestionPipeline(
+            workers,
+            INGEST_PER_HOST_LIMIT,
+            journal,
+            structure=True,
+            extract_workers=extract_workers,
+        ) as pipeline:
+            WordDownloader.session = http
+            for id_, site, url in corpus_rows(n_docs, duplicate_rate, seed):
+                pipeline.submit(id_, site, url)
+        journal.close()
+        return n_docs
+
+    def build():
+        nonlocal batch_manager
+        batch_manager = BatchManager("benchmark", incremental=False)
+        batch_manager.client = openai
+        batch_manager.async_client = FakeAsyncOpenAI(openai)
+        batch_manager.generate_json_batch(shard_prefix="benchmark_prompts")
+        batch_manager.send_batch_request()
+        lines = 0
+        for path in batch_manager.json_files:
+            with open(path, "rb") as file:
+                lines += sum(1 for _ in file)
+        return lines
+
+    def retrieve():
+        batch_manager.retrieve_results(sleep_time=0.01, max_sleep_time=0.05)
+
+    def post_process():
+        processor = ResultsProcessor(aliases=batch_manager.aliases)
+        processor.run(Path(batch_manager.group_file).stem)
+        return processor.written + len(processor.failed)
+
+    recorder.run("ingestion", ingest)
+    batched = recorder.run("batch_build", build)
+    if batched:
+        recorder.run("retrieval", retrieve, docs=batched)
+        recorder.run("post_processing", post_process)
+    return recorder.stages
+
+
+def _log_stages(n_docs: int, stages: List[dict]) -> None:
+    for stage in stages:
+        requests = {
+            name: sum(counts.values()) for name, counts in stage["requests"].items()
+        }
+        logger.info(
+            f"{n_docs:>7} docs | {stage['stage']:<15} {stage['docs']:>7} docs "
+            f"{stage['seconds']:>8.2f}s {stage['docs_per_s']:>9.1f} docs/s | "
+            f"peak RSS {format_bytes(stage['peak_rss'])} | requests {requests}"
+        )
+
+
+@app.command()
+def main(
+    sizes: str = typer.Option(
+        "1000,10000,100000", help="Corpus sizes, comma separated"
+    ),
+    workers: int = typer.Option(INGEST_WORKERS, help="Ingestion threads"),
+    extract_workers: int = typer.Option(EXTRACT_WORKERS, help="Parsing processes"),
+    error_rate: float = typer.Option(0.02, help="Share of failed batch requests"),
+    ambiguous_rate: float = typer.Option(0.3, help="Share of unstyled documents"),
+    duplicate_rate: float = typer.Option(0.1, help="Share of duplicated documents"),
+    results_file: Path = typer.Option(RESULTS_FILE, help="JSONL history of the runs"),
+    with_metrics: bool = typer.Option(False, help="Run with tools.metrics enabled"),
+):
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    run_at = datetime.now().isoformat(timespec="seconds")
+    for n_docs in (int(size) for size in sizes.split(",")):
+        # A fresh process per size, so that the peak RSS of a run is its own, and
+        # its files are written in a temporary directory, never in DATA_DIR
+        with tempfile.TemporaryDirectory(prefix="benchmark-") as directory:
+            with isolated_settings(Path(directory)), ProcessPoolExecutor(
+                1, mp_context=get_context("spawn")
+            ) as pool:
+                stages = pool.submit(
+                    run_pipeline,
+                    n_docs,
+                    workers,
+                    extract_workers,
+                    error_rate,
+                    ambiguous_rate,
+                    duplicate_rate,
+                    with_metrics=with_metrics,
+                ).result()
+        _log_stages(n_docs, stages)
+        with open(results_file, "a") as file:
+            for stage in stages:
+                record = {
+                    "run_at": run_at,
+                    "n_docs": n_docs,
+                    "workers": workers,
+                    "extract_workers": extract_workers,
+                    "metrics": with_metrics,
+                    "cpus": os.cpu_count(),
+                    "python": platform.python_version(),
+                    **stage,
+                }
+                file.write(json.dumps(record) + "\n")
+    logger.info(f"Results appended to {results_file}")
+
+
+if __name__ == "__main__":
+    app()
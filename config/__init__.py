@@ -2,6 +2,20 @@
 Created by Analitika at 08/08/2024
 contact@analitika.fr
 """
+# External imports
+from importlib import import_module
 
-# Variables
-from config.settings import *
+# Variables of config.settings, loaded on first access (PEP 562): importing the
+# package neither reads the .env file nor logs until a setting is actually used
+
+
+def __getattr__(name):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    value = getattr(import_module("config.settings"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return [n for n in dir(import_module("config.settings")) if not n.startswith("_")]
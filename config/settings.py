@@ -4,6 +4,7 @@ contact@analitika.fr
 """
 
 # External imports
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -14,7 +15,7 @@ load_dotenv()
 
 # Paths
 PROJ_ROOT = Path(__file__).resolve().parents[1]
-DATA_DIR = PROJ_ROOT / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", PROJ_ROOT / "data"))
 logger.info(f"PROJ_ROOT path is: {PROJ_ROOT}")
 
 # Environment variables for AWS credentials and configuration
@@ -27,9 +28,111 @@ RAW_DATA_FOLDER = "raw_content"
 STRUCTURED_DATA_FOLDER = "structured_content"
 BATCH_OUTPUT_FOLDER = "batch_output"
 
+# Concurrent reads of S3 objects
+S3_FETCH_WORKERS = int(os.getenv("S3_FETCH_WORKERS", 16))
+S3_FETCH_RETRIES = int(os.getenv("S3_FETCH_RETRIES", 3))
+S3_STREAM_CHUNK_SIZE = int(os.getenv("S3_STREAM_CHUNK_SIZE", 1024 * 1024))
+S3_MULTIPART_PART_SIZE = int(os.getenv("S3_MULTIPART_PART_SIZE", 8 * 1024**2))
+S3_BULK_WORKERS = int(os.getenv("S3_BULK_WORKERS", 32))
+
+# Shared AWS clients: connection pool, retries and managed transfers
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 64))
+S3_RETRY_MODE = os.getenv("S3_RETRY_MODE", "standard")  # legacy | standard | adaptive
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 5))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", 10))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", 60))
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 64 * 1024**2))
+S3_TRANSFER_CONCURRENCY = int(os.getenv("S3_TRANSFER_CONCURRENCY", 10))
+
+# Content-Encoding of the objects written to each folder (gzip | zstd), as JSON, e.g.
+# {"raw_content": "gzip", "batch_output": "gzip"}. Nothing is compressed by default,
+# the folders may be read with a plain get_object by other applications
+S3_COMPRESSION = json.loads(os.getenv("S3_COMPRESSION", "{}"))
+
+# Opt-in disk cache of downloaded S3 objects, disabled unless S3_CACHE_DIR is set
+S3_CACHE_DIR = os.getenv("S3_CACHE_DIR", None)
+S3_CACHE_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_BYTES", 10 * 1024**3))
+
+# Local index of S3 folder listings
+S3_USE_MANIFEST = os.getenv("S3_USE_MANIFEST", "false").lower() == "true"
+S3_MANIFEST_DIR = Path(os.getenv("S3_MANIFEST_DIR", DATA_DIR / "manifests"))
+S3_MANIFEST_MAX_AGE = float(os.getenv("S3_MANIFEST_MAX_AGE", 3600))
+
+# Ingestion of the docx manifest (data/raw/docx.csv)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 16))
+INGEST_PER_HOST_LIMIT = int(os.getenv("INGEST_PER_HOST_LIMIT", 8))
+INGEST_HTTP_TIMEOUT = float(os.getenv("INGEST_HTTP_TIMEOUT", 60))
+INGEST_JOURNAL_PATH = Path(
+    os.getenv("INGEST_JOURNAL_PATH", DATA_DIR / "raw" / "ingestion_journal.db")
+)
+
+# Parsing of the documents on a process pool (0 parses inline)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 1))
+EXTRACT_CHUNKSIZE = int(os.getenv("EXTRACT_CHUNKSIZE", 16))
+
 # OPENAI IDENTIFIERS AND PARAMETERS
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", None)
 COMPLETIONS_MODEL = os.getenv("COMPLETIONS_MODEL", None)
 
+# Limits of a single batch input file, larger batches are split in shards
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 50_000))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", 190 * 1024**2))
+BATCH_SUBMIT_WORKERS = int(os.getenv("BATCH_SUBMIT_WORKERS", 4))
+BATCH_JSON_ENCODER = os.getenv("BATCH_JSON_ENCODER", "json")  # json | orjson
+
+# Documents whose prompt would exceed this size are split at their headings in several
+# requests, see batching/chunking.py. The answer restates the text, so this also bounds
+# the output tokens. 0 sends every document whole
+BATCH_MAX_PROMPT_TOKENS = int(os.getenv("BATCH_MAX_PROMPT_TOKENS", 6000))
+# Template of the requests, see batching/prompts.py. structure-v1 is the original
+# layout, structure-v2 shares the instructions in a compact system message
+PROMPT_TEMPLATE = os.getenv("PROMPT_TEMPLATE", "structure-v2")
+
+# Incremental batches: documents whose raw text and prompt did not change since they
+# were sent are left out, see batching/batch_index.py. Off by default, it changes
+# what generate_json_batch sends
+BATCH_INCREMENTAL = os.getenv("BATCH_INCREMENTAL", "false").lower() == "true"
+BATCH_INDEX_PATH = Path(
+    os.getenv("BATCH_INDEX_PATH", DATA_DIR / "batch_ids" / "batch_index.db")
+)
+
+# Documents with the same normalized text (same article on several sites, repeated
+# URLs) are sent once, and the result is copied to each of them
+BATCH_DEDUP = os.getenv("BATCH_DEDUP", "true").lower() == "true"
+
+# Tracking of submitted batches
+BATCH_POLL_MIN_INTERVAL = float(os.getenv("BATCH_POLL_MIN_INTERVAL", 60))
+BATCH_POLL_MAX_INTERVAL = float(os.getenv("BATCH_POLL_MAX_INTERVAL", 1800))
+BATCH_POLL_CONCURRENCY = int(os.getenv("BATCH_POLL_CONCURRENCY", 8))
+# Attempts at storing the results of a finished batch before giving up on it
+BATCH_HANDLE_MAX_ATTEMPTS = int(os.getenv("BATCH_HANDLE_MAX_ATTEMPTS", 5))
+BATCH_COMPLETION_WINDOW_HOURS = 24
+
+# Real-time mode: the batch requests sent to the chat completions endpoint directly,
+# within the rate limits of the account, see batching/realtime.py
+REALTIME_RPM = float(os.getenv("REALTIME_RPM", 500))
+REALTIME_TPM = float(os.getenv("REALTIME_TPM", 200_000))
+REALTIME_CONCURRENCY = int(os.getenv("REALTIME_CONCURRENCY", 16))
+REALTIME_MAX_RETRIES = int(os.getenv("REALTIME_MAX_RETRIES", 6))
+# Jobs up to this size are always sent in real time, whatever their deadline
+REALTIME_MAX_REQUESTS = int(os.getenv("REALTIME_MAX_REQUESTS", 100))
+
+# Post-processing of batch outputs into STRUCTURED_DATA_FOLDER
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", 32))
+
+# Documents whose docx styles give an unambiguous heading structure are structured
+# at ingestion and left out of the OpenAI batch
+LOCAL_STRUCTURE = os.getenv("LOCAL_STRUCTURE", "true").lower() == "true"
+LOCAL_STRUCTURE_MAX_LEVEL = int(os.getenv("LOCAL_STRUCTURE_MAX_LEVEL", 4))
+LOCAL_STRUCTURE_MAX_SECTION_CHARS = int(
+    os.getenv("LOCAL_STRUCTURE_MAX_SECTION_CHARS", 20_000)
+)
+
+# Per-stage timings, S3 requests and bytes, prompt sizes and batch latencies, off
+# unless METRICS is true. Exported as JSON log lines and/or a Prometheus textfile
+METRICS_ENABLED = os.getenv("METRICS", "false").lower() == "true"
+METRICS_JSON_LOG = os.getenv("METRICS_JSON_LOG", None)
+METRICS_PROMETHEUS_FILE = os.getenv("METRICS_PROMETHEUS_FILE", None)
+
 if __name__ == "__main__":
     print(COMPLETIONS_MODEL)
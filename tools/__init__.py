@@ -2,6 +2,29 @@
 Created by Analitika at 03/07/2024
 contact@analitika.fr
 """
+# External imports
+from importlib import import_module
 
-from tools.aws_storage import S3Manager
-from tools.error_handling import get_frames_locals
+# Exported names and their modules, imported on first access (PEP 562), so that
+# importing one tool does not load boto3 or pandas for the others
+_EXPORTS = {
+    "S3Manager": "tools.aws_storage",
+    "get_frames_locals": "tools.error_handling",
+    "IngestionJournal": "tools.journal",
+    "S3ManifestIndex": "tools.manifest",
+    "S3DiskCache": "tools.s3_cache",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'tools' has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
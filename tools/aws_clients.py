@@ -0,0 +1,140 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import os
+import threading
+from functools import partial
+from time import perf_counter
+from typing import TYPE_CHECKING, Dict, Tuple
+
+# Internal imports
+from config import (
+    AWS_ACCESS_KEY_ID,
+    AWS_REGION,
+    AWS_SECRET_ACCESS_KEY,
+    S3_MAX_POOL_CONNECTIONS,
+    S3_RETRY_MODE,
+    S3_MAX_ATTEMPTS,
+    S3_CONNECT_TIMEOUT,
+    S3_READ_TIMEOUT,
+    S3_MULTIPART_THRESHOLD,
+    S3_MULTIPART_PART_SIZE,
+    S3_TRANSFER_CONCURRENCY,
+)
+from tools.metrics import metrics
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+
+# boto3 clients are thread-safe, sessions are not: clients are built once per process
+# under the lock and then shared by every thread. Keying by pid gives a forked child
+# its own client instead of the connections of its parent. boto3 itself is only
+# imported when the first client or transfer config is built.
+_lock = threading.Lock()
+_clients: Dict[Tuple[int, str], object] = {}
+
+
+def client_config() -> "Config":
+    """
+    :return: Connection pool, timeouts and retry settings of the AWS clients
+    """
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=S3_CONNECT_TIMEOUT,
+        read_timeout=S3_READ_TIMEOUT,
+        retries={"mode": S3_RETRY_MODE, "total_max_attempts": S3_MAX_ATTEMPTS},
+    )
+
+
+def transfer_config() -> "TransferConfig":
+    """
+    :return: Multipart thresholds and concurrency of the managed uploads and downloads
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=S3_MULTIPART_PART_SIZE,
+        max_concurrency=S3_TRANSFER_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+def _before_call(service: str, model, params, context, **kwargs):
+    if not metrics.enabled:
+        return
+    context["metrics_start"] = perf_counter()
+    try:
+        sent = len(params.get("body") or b"")
+    except TypeError:  # unsized stream
+        return
+    if sent:
+        metrics.inc("aws_bytes_sent", sent, service=service)
+
+
+def _after_call(service: str, http_response, parsed, model, context, **kwargs):
+    if not metrics.enabled:
+        return
+    operation = model.name
+    status = getattr(http_response, "status_code", None)
+    metrics.inc("aws_requests", service=service, operation=operation, status=status)
+    start = context.get("metrics_start")
+    if start is not None:
+        metrics.observe(
+            "aws_request_seconds",
+            perf_counter() - start,
+            service=service,
+            operation=operation,
+        )
+    if operation == "GetObject" and status == 200:
+        received = parsed.get("ContentLength") or 0
+        metrics.inc("aws_bytes_received", received, service=service)
+
+
+def _instrument(client, service: str) -> None:
+    # Counts, latency and bytes of every API call, see tools.metrics
+    events = client.meta.events
+    service_id = client.meta.service_model.service_id.hyphenize()
+    events.register(f"before-call.{service_id}", partial(_before_call, service))
+    events.register(f"after-call.{service_id}", partial(_after_call, service))
+
+
+def get_client(service: str = "s3"):
+    """
+    Process-wide client of an AWS service, built on first use.
+    :param service: Name of the service, e.g. "s3"
+    :return: The shared client
+    """
+    key = (os.getpid(), service)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+
+                client = boto3.Session(
+                    aws_access_key_id=AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                    region_name=AWS_REGION,
+                ).client(service, config=client_config())
+                _instrument(client, service)
+                _clients[key] = client
+    return client
+
+
+def register_client(client, service: str = "s3") -> None:
+    # Replace the shared client of this process, e.g. by a local stand-in in benchmarks
+    with _lock:
+        _clients[(os.getpid(), service)] = client
+
+
+def reset_clients() -> None:
+    # Drop the shared clients, e.g. after the credentials changed
+    with _lock:
+        _clients.clear()
@@ -3,29 +3,79 @@ Created by Analitika at 27/03/2024
 contact@analitika.fr
 """
 # External imports
-import gzip
+import codecs
 import json
+import os
+import tempfile
 from io import BytesIO
-from typing import Union, List
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import pickle
-import boto3  # AWS SDK for Python
-from botocore.exceptions import ClientError
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import BotoCoreError, ClientError
 from loguru import logger
 
 # Internal imports
-from config import AWS_ACCESS_KEY_ID, AWS_REGION, AWS_SECRET_ACCESS_KEY, S3_BUCKET_NAME
+from config import (
+    S3_BUCKET_NAME,
+    S3_FETCH_WORKERS,
+    S3_FETCH_RETRIES,
+    S3_STREAM_CHUNK_SIZE,
+    S3_CACHE_DIR,
+    S3_CACHE_MAX_BYTES,
+    S3_MULTIPART_PART_SIZE,
+    S3_BULK_WORKERS,
+)
+from tools.aws_clients import get_client, transfer_config
+from tools.compression import (
+    GZIP_MAGIC,
+    CompressionStats,
+    compress_bytes,
+    compress_stream,
+    compression_for,
+    decompress_bytes,
+    decompress_stream,
+    gunzip_stream,
+    resolve_encoding,
+)
+from tools.concurrency import ordered_map
+from tools.s3_cache import S3DiskCache
+
+DELETE_BATCH_SIZE = 1000  # maximum number of keys of a DeleteObjects request
+# Errors of a single request (ClientError) and of the managed transfers used for large
+# objects, which wrap them or fail on the connection (BotoCoreError)
+TRANSFER_ERRORS = (ClientError, BotoCoreError, S3UploadFailedError)
 
 
 class S3Manager:
-    def __init__(self):
+    def __init__(self, cache: Optional[S3DiskCache] = None):
         """
-        Initialize the S3Manager with AWS credentials.
+        Initialize the S3Manager, the S3 client shared by the whole process is only
+        built on first use.
+        :param cache: Disk cache for downloads, built from S3_CACHE_DIR when it is set
         """
-        self.s3_client = boto3.Session(
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION,
-        ).client("s3")
+        self._transfer_config = None
+        if cache is None and S3_CACHE_DIR:
+            cache = S3DiskCache(S3_CACHE_DIR, S3_CACHE_MAX_BYTES)
+        self.cache = cache
+        self.compression = CompressionStats()
+
+    @property
+    def s3_client(self):
+        return get_client("s3")
+
+    @property
+    def transfer_config(self):
+        if self._transfer_config is None:
+            self._transfer_config = transfer_config()
+        return self._transfer_config
+
+    @staticmethod
+    def _encoding(folder: str, compression: Optional[str]) -> Optional[str]:
+        # Explicit compression wins over the S3_COMPRESSION policy of the folder
+        if compression is None:
+            return compression_for(folder)
+        return resolve_encoding(compression)
 
     def get_available_files(self, folder: str) -> List[str]:
         """
@@ -35,25 +85,42 @@ class S3Manager:
         """
         files = []
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=S3_BUCKET_NAME, Prefix=folder
-            )
-            if "Contents" in response:
-                for file in response["Contents"]:
-                    filename = file["Key"][len(folder) + 1 :]
-                    if filename:
-                        files.append(filename)
-
+            for obj in self.iter_objects(folder):
+                files.append(obj["name"])
         except ClientError as e:
             logger.error(str(e))
         return files
 
+    def iter_objects(self, folder: str) -> Iterator[dict]:
+        """
+        Lazily list every object of a folder, following the listing pagination.
+        :param folder: The folder within the S3 bucket
+        :return: Iterator of dicts with the key, name (relative to folder), size,
+                 etag and last_modified of each object
+        :raises ClientError: If a page of the listing cannot be retrieved
+        """
+        # The trailing slash keeps "raw" from matching "raw_content"
+        prefix = folder.rstrip("/") + "/" if folder else ""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+            for file in page.get("Contents", []):
+                filename = file["Key"][len(prefix) :]
+                if filename:
+                    yield {
+                        "key": file["Key"],
+                        "name": filename,
+                        "size": file["Size"],
+                        "etag": file["ETag"].strip('"'),
+                        "last_modified": file["LastModified"],
+                    }
+
     def upload_to_s3(
         self,
         file_name: str,
         data: bytes,
         folder: str,
         content_type: str = "application/octet-stream",
+        compression: Optional[str] = None,
     ) -> int:
         """
         Upload a file to an AWS S3 bucket.
@@ -61,21 +128,120 @@ class S3Manager:
         :param data: The data to be uploaded
         :param folder: The folder within the S3 bucket where the file will be stored
         :param content_type: The content type of the file
+        :param compression: "gzip", "zstd" or "identity", the folder policy by default.
+                            The encoding is stored as the Content-Encoding of the object
         :return: int status code (0 for success, 1 for failure)
         """
         try:
             s3_file_key = f"{folder}/{file_name}"
-            self.s3_client.put_object(
+            encoding = self._encoding(folder, compression)
+            body = compress_bytes(data, encoding)
+            extra = {"ContentEncoding": encoding} if encoding else {}
+            if len(body) >= self.transfer_config.multipart_threshold:
+                # Large bodies are sent as concurrent parts by the transfer manager
+                self.s3_client.upload_fileobj(
+                    BytesIO(body),
+                    S3_BUCKET_NAME,
+                    s3_file_key,
+                    ExtraArgs={"ContentType": content_type, **extra},
+                    Config=self.transfer_config,
+                )
+            else:
+                self.s3_client.put_object(
+                    Bucket=S3_BUCKET_NAME,
+                    Key=s3_file_key,
+                    Body=body,
+                    ContentType=content_type,
+                    **extra,
+                )
+            self.compression.add(encoding, len(data), len(body))
+            return 0
+        except TRANSFER_ERRORS as e:
+            logger.error(str(e))
+            return 1
+
+    def upload_stream_to_s3(
+        self,
+        file_name: str,
+        chunks: Iterable[bytes],
+        folder: str,
+        content_type: str = "application/octet-stream",
+        compression: Optional[str] = None,
+        part_size: int = S3_MULTIPART_PART_SIZE,
+    ) -> int:
+        """
+        Upload a stream to an AWS S3 bucket with a multipart upload, so that memory stays
+        bounded by part_size whatever the size of the stream.
+        :param file_name: The name of the file to be saved in S3
+        :param chunks: The data to be uploaded
+        :param folder: The folder within the S3 bucket where the file will be stored
+        :param content_type: The content type of the file
+        :param compression: "gzip", "zstd" or "identity", the folder policy by default.
+                            The stream is compressed on the fly
+        :param part_size: Size of the uploaded parts, at least 5 MB
+        :return: int status code (0 for success, 1 for failure)
+        """
+        s3_file_key = f"{folder}/{file_name}"
+        try:
+            encoding = self._encoding(folder, compression)
+            extra = {"ContentEncoding": encoding} if encoding else {}
+            upload_id = self.s3_client.create_multipart_upload(
                 Bucket=S3_BUCKET_NAME,
                 Key=s3_file_key,
-                Body=data,
                 ContentType=content_type,
-            )
-            return 0
+                **extra,
+            )["UploadId"]
         except ClientError as e:
             logger.error(str(e))
             return 1
 
+        parts = []
+        sizes = [0, 0]  # raw and stored bytes
+
+        def measured(chunks_: Iterable[bytes]) -> Iterator[bytes]:
+            for chunk_ in chunks_:
+                sizes[0] += len(chunk_)
+                yield chunk_
+
+        def upload_part(body: bytes) -> None:
+            response = self.s3_client.upload_part(
+                Bucket=S3_BUCKET_NAME,
+                Key=s3_file_key,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                Body=body,
+            )
+            parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+
+        try:
+            buffer = bytearray()
+            for chunk in compress_stream(measured(chunks), encoding):
+                sizes[1] += len(chunk)
+                buffer += chunk
+                if len(buffer) >= part_size:
+                    upload_part(bytes(buffer))
+                    buffer.clear()
+            # The last part can be smaller than the minimum part size, and the only one
+            if buffer or not parts:
+                upload_part(bytes(buffer))
+            self.s3_client.complete_multipart_upload(
+                Bucket=S3_BUCKET_NAME,
+                Key=s3_file_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            self.compression.add(encoding, *sizes)
+            return 0
+        except Exception as e:
+            logger.error(f"Upload of {s3_file_key} aborted: {e}")
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=S3_BUCKET_NAME, Key=s3_file_key, UploadId=upload_id
+                )
+            except ClientError as abort_error:
+                logger.error(str(abort_error))
+            return 1
+
     def delete_object_from_s3(self, file_name: str, folder: str) -> int:
         """
         Delete an object from an AWS S3 bucket.
@@ -92,6 +258,84 @@ class S3Manager:
             logger.error(str(e))
             return 1
 
+    def delete_objects_from_s3(
+        self,
+        file_names: Iterable[str],
+        folder: str,
+        max_workers: int = S3_BULK_WORKERS,
+        dry_run: bool = False,
+    ) -> int:
+        """
+        Delete many objects from an AWS S3 bucket, 1000 keys per DeleteObjects request.
+        :param file_names: The names of the files to be deleted from S3
+        :param folder: The folder within the S3 bucket where the files are stored
+        :param max_workers: Number of concurrent DeleteObjects requests
+        :param dry_run: Only log what would be deleted
+        :return: int status code (0 for success, 1 if any object was not deleted)
+        """
+        keys = (f"{folder}/{file_name}" for file_name in file_names)
+        deleted, failed = self._delete_keys(keys, max_workers, dry_run)
+        verb = "would be deleted" if dry_run else "deleted"
+        logger.info(f"{deleted} objects {verb} from {folder}, {failed} failed")
+        return int(failed > 0)
+
+    def _delete_batch(self, keys: List[str]) -> List[str]:
+        # Quiet mode only reports the keys that could not be deleted
+        response = self.s3_client.delete_objects(
+            Bucket=S3_BUCKET_NAME,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+        errors = response.get("Errors", [])
+        for error in errors[:10]:
+            logger.error(f"Deletion of {error['Key']} failed: {error.get('Message')}")
+        return [error["Key"] for error in errors]
+
+    def _delete_keys(
+        self, keys: Iterable[str], max_workers: int, dry_run: bool = False
+    ) -> Tuple[int, int]:
+        """
+        :return: Number of deleted and failed keys
+        """
+        keys = iter(keys)
+        batches = iter(lambda: list(islice(keys, DELETE_BATCH_SIZE)), [])
+        deleted = failed = 0
+        if dry_run:
+            for batch in batches:
+                for key in batch[:5]:
+                    logger.info(f"[dry run] delete {key}")
+                deleted += len(batch)
+            return deleted, failed
+
+        results = ordered_map(
+            self._delete_batch,
+            batches,
+            max_workers=max_workers,
+            retries=S3_FETCH_RETRIES,
+            retry_on=(ClientError, BotoCoreError),
+        )
+        for batch, errors in results:
+            errors = batch if errors is None else errors
+            deleted += len(batch) - len(errors)
+            failed += len(errors)
+        return deleted, failed
+
+    def delete_s3_folder(
+        self, folder: str, max_workers: int = S3_BULK_WORKERS, dry_run: bool = False
+    ) -> int:
+        """
+        Delete every object of a folder, whatever its size.
+        :return: int status code (0 for success, 1 for failure)
+        """
+        try:
+            keys = (obj["key"] for obj in self.iter_objects(folder))
+            deleted, failed = self._delete_keys(keys, max_workers, dry_run)
+        except ClientError as e:
+            logger.error(str(e))
+            return 1
+        verb = "would be deleted" if dry_run else "deleted"
+        logger.info(f"{deleted} objects {verb} from {folder}, {failed} failed")
+        return int(failed > 0)
+
     def check_file_exists(self, key: str) -> bool:
         """
         Check if a file exists in an S3 bucket.
@@ -107,41 +351,227 @@ class S3Manager:
             else:
                 raise
 
-    def download_from_s3(self, file_name: str, folder: str) -> Union[bytes, str, None]:
+    def download_from_s3(
+        self, file_name: str, folder: str, etag: Optional[str] = None
+    ) -> Union[bytes, str, None]:
         """
         Download a file from an AWS S3 bucket, with optional decompression for gzip files.
+        A single GET is issued, a missing key is reported without a separate HEAD request.
         :param file_name: The name of the file to be downloaded from S3 (with extension)
         :param folder: The folder within the S3 bucket where the file is stored (can be composed folder/subfolder)
+        :param etag: ETag of the object if known (e.g. from a listing), lets the cache answer without a request
         :return: The file content, decompressed if it's a gzip file, or None on failure
         """
+        try:
+            return self._fetch_object(file_name, folder, etag)
+        except ClientError as e:
+            logger.critical(str(e))
+            return None
+
+    def download_file_from_s3(self, file_name: str, folder: str, path: str) -> int:
+        """
+        Download a large file to disk with concurrent ranged GETs (see transfer_config),
+        decoding its Content-Encoding once it is complete.
+        :param file_name: The name of the file to be downloaded from S3 (with extension)
+        :param folder: The folder within the S3 bucket where the file is stored
+        :param path: Local destination of the file
+        :return: int status code (0 for success, 1 for failure)
+        """
         s3_file_key = f"{folder}/{file_name}"
-        if not self.check_file_exists(s3_file_key):
-            logger.error(
-                f"File '{s3_file_key}' does not exist in bucket '{S3_BUCKET_NAME}'."
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        os.close(fd)
+        try:
+            encoding = self.s3_client.head_object(
+                Bucket=S3_BUCKET_NAME, Key=s3_file_key
+            ).get("ContentEncoding")
+            self.s3_client.download_file(
+                S3_BUCKET_NAME, s3_file_key, tmp_path, Config=self.transfer_config
             )
-            return None
+            if encoding:
+                with open(tmp_path, "rb") as source, open(path, "wb") as target:
+                    chunks = iter(lambda: source.read(S3_STREAM_CHUNK_SIZE), b"")
+                    for chunk in decompress_stream(chunks, encoding):
+                        target.write(chunk)
+            else:
+                os.replace(tmp_path, path)
+            return 0
+        except TRANSFER_ERRORS as e:
+            logger.error(f"Download of {s3_file_key} failed: {e}")
+            return 1
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-        file_stream = BytesIO()
+    def _get_object(self, s3_file_key: str, **kwargs) -> Optional[dict]:
+        """
+        Issue a GET request, raising on every error except a missing key.
+        :param s3_file_key: The full key of the file in the S3 bucket
+        :param kwargs: Extra get_object parameters (e.g. IfNoneMatch)
+        :return: The get_object response, or None if the file does not exist
+        """
         try:
-            self.s3_client.download_fileobj(
-                Bucket=S3_BUCKET_NAME, Key=s3_file_key, Fileobj=file_stream
+            return self.s3_client.get_object(
+                Bucket=S3_BUCKET_NAME, Key=s3_file_key, **kwargs
             )
-            file_stream.seek(0)
-            # Handle gzip files
-            if file_name.endswith(".gz"):
-                with gzip.open(file_stream, "rb") as f_in:
-                    return f_in.read().decode("utf-8")
-
-            # Handle pickle files
-            if file_name.endswith(".pkl"):
-                return pickle.load(file_stream)
-
-            # Default: return content as a string
-            return file_stream.read().decode("utf-8")
         except ClientError as e:
-            logger.critical(str(e))
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                logger.error(
+                    f"File '{s3_file_key}' does not exist in bucket '{S3_BUCKET_NAME}'."
+                )
+                return None
+            raise
+
+    def _read_object(
+        self, s3_file_key: str, etag: Optional[str] = None
+    ) -> Optional[bytes]:
+        """
+        Read the bytes of an object, decoded according to its Content-Encoding, through
+        the disk cache when there is one (the cache holds decoded bytes). Without a
+        known ETag, a cached copy is revalidated with a conditional GET.
+        :return: The object bytes, or None if the file does not exist
+        """
+        if self.cache is None:
+            response = self._get_object(s3_file_key)
+            return None if response is None else self._read_body(response)
+
+        if etag is not None:
+            data = self.cache.get(S3_BUCKET_NAME, s3_file_key, etag)
+            if data is not None:
+                return data
+            # The listed version is not cached, revalidating an older one is pointless
+            cached_etag = None
+        else:
+            cached_etag = self.cache.known_etag(S3_BUCKET_NAME, s3_file_key)
+        try:
+            kwargs = {"IfNoneMatch": f'"{cached_etag}"'} if cached_etag else {}
+            response = self._get_object(s3_file_key, **kwargs)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("304", "NotModified"):
+                raise
+            data = self.cache.get(S3_BUCKET_NAME, s3_file_key, cached_etag)
+            if data is not None:
+                return data
+            # Evicted in the meantime by another process
+            response = self._get_object(s3_file_key)
+        if response is None:
             return None
 
+        data = self._read_body(response)
+        self.cache.put(S3_BUCKET_NAME, s3_file_key, response["ETag"].strip('"'), data)
+        return data
+
+    @staticmethod
+    def _read_body(response: dict) -> bytes:
+        return decompress_bytes(
+            response["Body"].read(), response.get("ContentEncoding")
+        )
+
+    def _fetch_object(
+        self, file_name: str, folder: str, etag: Optional[str] = None
+    ) -> Union[bytes, str, None]:
+        """
+        Download and decode a file, raising on every error except a missing key.
+        :return: The decoded content, or None if the file does not exist
+        """
+        data = self._read_object(f"{folder}/{file_name}", etag)
+        if data is None:
+            return None
+
+        # Handle pickle files
+        if file_name.endswith(".pkl"):
+            return pickle.loads(data)
+
+        # Objects written before Content-Encoding was set, gzipped under a .gz name
+        if file_name.endswith(".gz") and data[:2] == GZIP_MAGIC:
+            data = b"".join(gunzip_stream([data]))
+
+        # Default: return content as a string
+        return data.decode("utf-8")
+
+    def iter_chunks_from_s3(
+        self, file_name: str, folder: str, chunk_size: int = S3_STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        Stream a file from an AWS S3 bucket, decoding its Content-Encoding as data arrives.
+        :param file_name: The name of the file to be downloaded from S3 (with extension)
+        :param folder: The folder within the S3 bucket where the file is stored
+        :param chunk_size: Size of the chunks read from the response body
+        :return: Iterator of bytes chunks, empty if the file does not exist
+        """
+        try:
+            response = self._get_object(f"{folder}/{file_name}")
+        except ClientError as e:
+            logger.critical(str(e))
+            return
+        if response is None:
+            return
+
+        chunks = response["Body"].iter_chunks(chunk_size)
+        encoding = response.get("ContentEncoding")
+        if encoding:
+            chunks = decompress_stream(chunks, encoding)
+        elif file_name.endswith(".gz"):
+            chunks = gunzip_stream(chunks)  # written before Content-Encoding was set
+        yield from chunks
+
+    def iter_lines_from_s3(
+        self,
+        file_name: str,
+        folder: str,
+        chunk_size: int = S3_STREAM_CHUNK_SIZE,
+        encoding: str = "utf-8",
+    ) -> Iterator[str]:
+        """
+        Stream a text file (e.g. a JSONL batch output) line by line.
+        :param file_name: The name of the file to be downloaded from S3 (with extension)
+        :param folder: The folder within the S3 bucket where the file is stored
+        :param chunk_size: Size of the chunks read from the response body
+        :param encoding: Text encoding of the file
+        :return: Iterator of lines without their line terminator
+        """
+        decoder = codecs.getincrementaldecoder(encoding)()
+        pending = ""
+        for chunk in self.iter_chunks_from_s3(file_name, folder, chunk_size):
+            pending += decoder.decode(chunk)
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip("\r")
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending.rstrip("\r")
+
+    def download_many(
+        self,
+        file_names: Iterable[str],
+        folder: str,
+        max_workers: int = S3_FETCH_WORKERS,
+        retries: int = S3_FETCH_RETRIES,
+        etags: Optional[Dict[str, str]] = None,
+    ) -> Iterator[Tuple[str, Union[bytes, str, None]]]:
+        """
+        Download several files concurrently, yielding them in the order of file_names.
+        :param file_names: The names of the files to be downloaded (with extension)
+        :param folder: The folder within the S3 bucket where the files are stored
+        :param max_workers: Number of concurrent downloads
+        :param retries: Number of retries of a file that failed, a stalled request is
+                        ended by the read timeout of the client (S3_READ_TIMEOUT)
+        :param etags: ETags of the files by name, lets the cache answer without a request
+        :return: Iterator of (file_name, content), content is None on failure
+        """
+        etags = etags or {}
+        return ordered_map(
+            lambda file_name: self._fetch_object(
+                file_name, folder, etags.get(file_name)
+            ),
+            file_names,
+            max_workers=max_workers,
+            retries=retries,
+            retry_on=(ClientError, BotoCoreError),
+        )
+
     def rename_s3_folder(self, old_folder: str, new_folder: str) -> None:
         """
         Rename a folder in S3 by copying all objects from the old folder to the new folder
@@ -149,27 +579,145 @@ class S3Manager:
         :param old_folder: The name of the existing folder in S3
         :param new_folder: The new folder name to move the objects to
         """
-        try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=S3_BUCKET_NAME, Prefix=old_folder
-            )
-            if "Contents" not in response:
-                logger.info(f"No objects found in the folder: {old_folder}")
-                return
-
-            for obj in response["Contents"]:
-                old_key = obj["Key"]
-                new_key = old_key.replace(old_folder, new_folder, 1)
-                self.s3_client.copy_object(
-                    Bucket=S3_BUCKET_NAME,
-                    CopySource={"Bucket": S3_BUCKET_NAME, "Key": old_key},
-                    Key=new_key,
-                )
-                self.s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=old_key)
-                logger.info(f"Moved {old_key} to {new_key}")
+        if self.move_s3_folder(old_folder, new_folder) == 0:
             logger.info(f"Folder renamed from {old_folder} to {new_folder}")
+
+    def copy_s3_folder(
+        self,
+        source: str,
+        destination: str,
+        max_workers: int = S3_BULK_WORKERS,
+        dry_run: bool = False,
+    ) -> int:
+        """
+        Copy every object of a folder to another folder. Objects already copied are
+        skipped, so an interrupted copy resumes where it stopped.
+        :return: int status code (0 for success, 1 for failure)
+        """
+        return self._transfer_folder(source, destination, max_workers, dry_run)
+
+    def move_s3_folder(
+        self,
+        source: str,
+        destination: str,
+        max_workers: int = S3_BULK_WORKERS,
+        dry_run: bool = False,
+    ) -> int:
+        """
+        Copy a folder, then delete the source objects that are in the destination.
+        Running it again after an interruption finishes the move.
+        :return: int status code (0 for success, 1 for failure)
+        """
+        return self._transfer_folder(
+            source, destination, max_workers, dry_run, delete_source=True
+        )
+
+    def sync_s3_folder(
+        self,
+        source: str,
+        destination: str,
+        delete_extra: bool = False,
+        max_workers: int = S3_BULK_WORKERS,
+        dry_run: bool = False,
+    ) -> int:
+        """
+        Make a folder a copy of another: new and changed objects are copied and, with
+        delete_extra, objects missing from the source are deleted.
+        :return: int status code (0 for success, 1 for failure)
+        """
+        return self._transfer_folder(
+            source, destination, max_workers, dry_run, delete_extra=delete_extra
+        )
+
+    @staticmethod
+    def _same_object(source: dict, target: Optional[dict]) -> bool:
+        if target is None or source["size"] != target["size"]:
+            return False
+        if source["etag"] == target["etag"]:
+            return True
+        # The ETag of a multipart upload changes when it is copied in a single request
+        return (
+            "-" in source["etag"] and target["last_modified"] >= source["last_modified"]
+        )
+
+    def _copy_key(self, source_key: str, target_key: str) -> bool:
+        # Metadata, including the Content-Encoding, is copied along with the object
+        self.s3_client.copy_object(
+            Bucket=S3_BUCKET_NAME,
+            CopySource={"Bucket": S3_BUCKET_NAME, "Key": source_key},
+            Key=target_key,
+        )
+        return True
+
+    def _transfer_folder(
+        self,
+        source: str,
+        destination: str,
+        max_workers: int,
+        dry_run: bool,
+        delete_source: bool = False,
+        delete_extra: bool = False,
+    ) -> int:
+        """
+        Copy the objects of source that are missing or different in destination, on a
+        thread pool, then delete the source objects (move) or the extra destination
+        objects (sync) with DeleteObjects requests.
+        """
+        source, destination = source.rstrip("/"), destination.rstrip("/")
+        try:
+            existing = {obj["name"]: obj for obj in self.iter_objects(destination)}
+            objects = list(self.iter_objects(source))
         except ClientError as e:
-            logger.info(f"Error renaming folder: {str(e)}")
+            logger.error(str(e))
+            return 1
+
+        to_copy, in_place = [], []
+        for obj in objects:
+            if self._same_object(obj, existing.get(obj["name"])):
+                in_place.append(obj["key"])
+            else:
+                to_copy.append(obj)
+
+        copied, failed = 0, 0
+        if dry_run:
+            for obj in to_copy[:5]:
+                logger.info(f"[dry run] copy {obj['key']} to {destination}")
+            copied = len(to_copy)
+            in_place.extend(obj["key"] for obj in to_copy)
+        else:
+            results = ordered_map(
+                lambda obj: self._copy_key(obj["key"], f"{destination}/{obj['name']}"),
+                to_copy,
+                max_workers=max_workers,
+                retries=S3_FETCH_RETRIES,
+                retry_on=(ClientError, BotoCoreError),
+            )
+            for obj, ok in results:
+                if ok:
+                    copied += 1
+                    in_place.append(obj["key"])
+                else:
+                    failed += 1
+                    logger.error(f"Copy of {obj['key']} failed")
+
+        deleted = 0
+        if delete_source:
+            # Only the objects safely in the destination leave the source
+            deleted, failed_deletes = self._delete_keys(in_place, max_workers, dry_run)
+            failed += failed_deletes
+        if delete_extra:
+            names = {obj["name"] for obj in objects}
+            extra = (obj["key"] for name, obj in existing.items() if name not in names)
+            deleted, failed_deletes = self._delete_keys(extra, max_workers, dry_run)
+            failed += failed_deletes
+
+        skipped = len(objects) - len(to_copy)
+        logger.info(
+            f"{'[dry run] ' if dry_run else ''}{source} -> {destination}: "
+            f"{copied} copied, {skipped} already there, {deleted} deleted, "
+            f"{failed} failed"
+        )
+        return int(failed > 0)
 
 
 def test():
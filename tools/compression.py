@@ -0,0 +1,173 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, Optional
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Internal imports
+from config import S3_COMPRESSION
+
+GZIP = "gzip"
+ZSTD = "zstd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def gunzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Decompress a gzip stream incrementally, including concatenated gzip members.
+    :param chunks: Compressed chunks
+    :return: Iterator of decompressed chunks
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if decompressor.eof:
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                chunk = b""
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compress a stream incrementally in the gzip format.
+    :param chunks: Uncompressed chunks
+    :param level: Compression level
+    :return: Iterator of compressed chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _zstd_compress_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _zstd_decompress_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+
+
+def resolve_encoding(encoding: Optional[str]) -> Optional[str]:
+    """
+    :param encoding: Requested Content-Encoding, "gzip", "zstd" or None/"identity"
+    :return: The encoding to write, zstd falls back to gzip when zstandard is missing
+    """
+    if not encoding or encoding == "identity":
+        return None
+    if encoding == ZSTD and zstandard is None:
+        logger.warning("zstandard is not installed, compressing with gzip")
+        return GZIP
+    if encoding not in (GZIP, ZSTD):
+        raise ValueError(f"Unsupported Content-Encoding {encoding!r}")
+    return encoding
+
+
+def compression_for(
+    folder: str, policy: Dict[str, str] = S3_COMPRESSION
+) -> Optional[str]:
+    """
+    Content-Encoding of the objects written to a folder, from the most specific
+    folder of the policy (raw_content applies to raw_content/FR too).
+    """
+    matches = [
+        prefix
+        for prefix in policy
+        if folder == prefix or folder.startswith(prefix.rstrip("/") + "/")
+    ]
+    if not matches:
+        return None
+    return resolve_encoding(policy[max(matches, key=len)])
+
+
+def compress_stream(
+    chunks: Iterable[bytes], encoding: Optional[str]
+) -> Iterator[bytes]:
+    if encoding == GZIP:
+        return gzip_stream(chunks)
+    if encoding == ZSTD:
+        return _zstd_compress_stream(chunks)
+    return iter(chunks)
+
+
+def decompress_stream(
+    chunks: Iterable[bytes], encoding: Optional[str]
+) -> Iterator[bytes]:
+    if encoding == GZIP:
+        return gunzip_stream(chunks)
+    if encoding == ZSTD:
+        if zstandard is None:
+            raise ImportError("zstandard is required to read zstd objects")
+        return _zstd_decompress_stream(chunks)
+    return iter(chunks)
+
+
+def compress_bytes(data: bytes, encoding: Optional[str]) -> bytes:
+    return b"".join(compress_stream([data], encoding))
+
+
+def decompress_bytes(data: bytes, encoding: Optional[str]) -> bytes:
+    return b"".join(decompress_stream([data], encoding))
+
+
+class CompressionStats:
+    """
+    Bytes given to the uploads and bytes actually stored, by Content-Encoding.
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, encoding: Optional[str], raw: int, stored: int) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(encoding or "identity", [0, 0, 0])
+            totals[0] += 1
+            totals[1] += raw
+            totals[2] += stored
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                encoding: {"objects": objects, "raw": raw, "stored": stored}
+                for encoding, (objects, raw, stored) in self._totals.items()
+            }
+
+    def report(self) -> None:
+        for encoding, totals in self.summary().items():
+            if encoding == "identity":
+                continue
+            raw, stored = totals["raw"], totals["stored"]
+            saved = raw - stored
+            logger.info(
+                f"{totals['objects']} objects stored with {encoding}: "
+                f"{raw / 1024 ** 2:.1f} MB -> {stored / 1024 ** 2:.1f} MB, "
+                f"{saved / 1024 ** 2:.1f} MB saved ({saved / max(raw, 1):.0%})"
+            )
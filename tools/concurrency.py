@@ -0,0 +1,75 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from time import sleep
+from typing import Any, Callable, Iterable, Iterator, Tuple, Type
+from loguru import logger
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """
+    Exponential backoff with full jitter.
+    :param attempt: Number of the failed attempt, starting at 0
+    :param base: Delay of the first retry in seconds
+    :param cap: Maximum delay in seconds
+    :return: Seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def ordered_map(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = 8,
+    retries: int = 0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    backoff: float = 0.5,
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Apply func to every item on a bounded thread pool and yield (item, result) pairs
+    in the order of the items, whatever the order in which the calls complete.
+    Only 2 * max_workers items are in flight at once, so items can be a lazy iterator.
+    A call is never abandoned while it runs: func bounds its own duration (e.g. the
+    connect and read timeouts of the AWS clients), and a call is only retried once it
+    raised.
+    :param func: Function called with one item
+    :param items: Items to process
+    :param max_workers: Number of threads
+    :param retries: Number of retries of a call that raised one of retry_on
+    :param retry_on: Exceptions that trigger a retry
+    :param backoff: Delay of the first retry in seconds, doubled on every attempt
+    :return: Iterator of (item, result), result is None if every attempt failed
+    """
+    items = iter(items)
+    max_workers = max(1, max_workers)
+    window = deque()
+    with ThreadPoolExecutor(max_workers) as pool:
+        for item in islice(items, 2 * max_workers):
+            window.append((item, pool.submit(func, item)))
+
+        while window:
+            item, future = window.popleft()
+            result = None
+            for attempt in range(retries + 1):
+                try:
+                    result = future.result()
+                    break
+                except retry_on as e:
+                    if attempt == retries:
+                        logger.error(
+                            f"Giving up on {item!s:.200} after {attempt + 1} attempts: {e!r}"
+                        )
+                        break
+                    logger.warning(f"Retrying {item!s:.200} ({e!r})")
+                    sleep(backoff_delay(attempt, backoff))
+                    future = pool.submit(func, item)
+
+            for next_item in islice(items, 1):
+                window.append((next_item, pool.submit(func, next_item)))
+            yield item, result
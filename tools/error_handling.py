@@ -3,7 +3,7 @@ Created by Analitika at 07/04/2023
 contact@analitika.fr
 """
 # External imports
-import pandas as pd
+import sys
 
 
 def get_frames_locals(tb, limit):
@@ -22,6 +22,8 @@ def get_frames_locals(tb, limit):
         f = f.f_back
     stack.reverse()
     st_framemsg = ["Locals by frame, innermost last"]
+    # No local can be a DataFrame unless pandas was imported by the program
+    pd = sys.modules.get("pandas")
     keep = False
     for frame in stack:
         if frame.f_code.co_name == limit:
@@ -35,7 +37,7 @@ def get_frames_locals(tb, limit):
         )
         for key, value in frame.f_locals.items():
             try:
-                if isinstance(value, pd.core.generic.NDFrame):
+                if pd is not None and isinstance(value, pd.core.generic.NDFrame):
                     st_value = repr(value.iloc[:5, :15])
                     st_value = "\n\t\t{:20s}  \t".format(" ").join(
                         ["{} object - see head x 15 below".format(type(value))]
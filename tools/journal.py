@@ -0,0 +1,136 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Union
+
+DONE = "done"
+FAILED = "failed"
+
+
+class IngestionJournal:
+    """
+    Persistent record of every (id, site, url) row of an ingestion run, so that an
+    interrupted run can be resumed without downloading and uploading again.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Open (or create) the journal.
+        :param path: Location of the SQLite file
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingestion (
+                id TEXT NOT NULL,
+                site TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL,
+                content_hash TEXT,
+                s3_key TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (id, site, url)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, id_: str, site: str, url: str) -> Optional[dict]:
+        """
+        :return: The journal entry of a row, or None if it was never processed
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT status, content_hash, s3_key, error, attempts, updated_at "
+                "FROM ingestion WHERE id = ? AND site = ? AND url = ?",
+                (id_, site, url),
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        keys = ("status", "content_hash", "s3_key", "error", "attempts", "updated_at")
+        return dict(zip(keys, row))
+
+    def should_process(
+        self,
+        id_: str,
+        site: str,
+        url: str,
+        since: Optional[datetime] = None,
+        only_failed: bool = False,
+    ) -> bool:
+        """
+        Decide whether a manifest row has to be (re)processed.
+        :param since: Also re-process rows whose entry was recorded at or after this time
+        :param only_failed: Only retry rows recorded as failed, ignore new rows
+        :return: True if the row has to be processed
+        """
+        entry = self.get(id_, site, url)
+        if entry is None:
+            return not only_failed
+        recent = since is not None and entry["updated_at"] >= since.isoformat()
+        if only_failed:
+            return entry["status"] == FAILED and (since is None or recent)
+        return entry["status"] != DONE or recent
+
+    def record_done(
+        self, id_: str, site: str, url: str, content_hash: str, s3_key: str
+    ) -> None:
+        self._record(id_, site, url, DONE, content_hash, s3_key, None)
+
+    def record_failed(self, id_: str, site: str, url: str, error: str) -> None:
+        self._record(id_, site, url, FAILED, None, None, error)
+
+    def _record(self, id_, site, url, status, content_hash, s3_key, error) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO ingestion
+                    (id, site, url, status, content_hash, s3_key, error, attempts, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (id, site, url) DO UPDATE SET
+                    status = excluded.status,
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    s3_key = COALESCE(excluded.s3_key, s3_key),
+                    error = excluded.error,
+                    attempts = attempts + 1,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    id_,
+                    site,
+                    url,
+                    status,
+                    content_hash,
+                    s3_key,
+                    error,
+                    datetime.now().isoformat(),
+                ),
+            )
+            self._conn.commit()
+
+    def summary(self) -> dict:
+        """
+        :return: Number of rows per status
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT status, COUNT(*) FROM ingestion GROUP BY status"
+            )
+            return dict(cursor.fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
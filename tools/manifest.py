@@ -0,0 +1,150 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Union
+from loguru import logger
+
+# Internal imports
+from config import S3_BUCKET_NAME, S3_MANIFEST_DIR, S3_MANIFEST_MAX_AGE
+
+
+class S3ManifestIndex:
+    """
+    On-disk index of the objects of an S3 folder.
+    S3 cannot filter a listing by date, so a refresh still pages through the folder,
+    but only the entries whose LastModified changed are rewritten, and a refresh is
+    skipped altogether while the index is younger than max_age.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        folder: str,
+        path: Optional[Union[str, Path]] = None,
+        max_age: float = S3_MANIFEST_MAX_AGE,
+    ):
+        """
+        Open (or create) the index of a folder.
+        :param bucket: The S3Manager used to list the folder
+        :param folder: The folder within the S3 bucket
+        :param path: Location of the SQLite file, derived from the bucket and folder by default
+        :param max_age: Seconds during which the index is trusted without listing again
+        """
+        self.bucket = bucket
+        self.folder = folder
+        self.max_age = max_age
+        if path is None:
+            path = S3_MANIFEST_DIR / f"{S3_BUCKET_NAME}__{folder.replace('/', '__')}.db"
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS objects (
+                key TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT NOT NULL,
+                last_modified TEXT NOT NULL,
+                seen INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.commit()
+
+    @property
+    def refreshed_at(self) -> Optional[datetime]:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE name = 'refreshed_at'"
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def is_fresh(self) -> bool:
+        refreshed_at = self.refreshed_at
+        if refreshed_at is None:
+            return False
+        age = datetime.now(timezone.utc) - refreshed_at
+        return age.total_seconds() < self.max_age
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Bring the index up to date with the folder.
+        :param force: List the folder even if the index is still fresh
+        :return: Number of added, modified or removed entries
+        """
+        if not force and self.is_fresh():
+            return 0
+
+        row = self._conn.execute("SELECT MAX(seen) FROM objects").fetchone()
+        run = (row[0] or 0) + 1
+        known = dict(self._conn.execute("SELECT key, last_modified FROM objects"))
+        changed = 0
+        # A failed listing raises before stale entries are removed, and is rolled back
+        try:
+            for obj in self.bucket.iter_objects(self.folder):
+                last_modified = obj["last_modified"].isoformat()
+                if known.get(obj["key"]) != last_modified:
+                    changed += 1
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            obj["key"],
+                            obj["name"],
+                            obj["size"],
+                            obj["etag"],
+                            last_modified,
+                            run,
+                        ),
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE objects SET seen = ? WHERE key = ?", (run, obj["key"])
+                    )
+            removed = self._conn.execute("DELETE FROM objects WHERE seen < ?", (run,))
+            changed += removed.rowcount
+        except Exception:
+            self._conn.rollback()
+            raise
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('refreshed_at', ?)",
+            (datetime.now(timezone.utc).isoformat(),),
+        )
+        self._conn.commit()
+        logger.info(f"Manifest of {self.folder} refreshed, {changed} entries changed")
+        return changed
+
+    def iter_objects(self, since: Optional[datetime] = None) -> Iterator[dict]:
+        """
+        Iterate over the indexed objects, in key order.
+        :param since: Only the objects modified at or after this time
+        :return: Iterator of dicts shaped like S3Manager.iter_objects
+        """
+        query = "SELECT key, name, size, etag, last_modified FROM objects"
+        params = ()
+        if since is not None:
+            query += " WHERE last_modified >= ?"
+            params = (since.astimezone(timezone.utc).isoformat(),)
+        for key, name, size, etag, last_modified in self._conn.execute(
+            query + " ORDER BY key", params
+        ):
+            yield {
+                "key": key,
+                "name": name,
+                "size": size,
+                "etag": etag,
+                "last_modified": datetime.fromisoformat(last_modified),
+            }
+
+    def names(self, since: Optional[datetime] = None) -> Iterator[str]:
+        for obj in self.iter_objects(since):
+            yield obj["name"]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,264 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import atexit
+import os
+import threading
+from contextlib import nullcontext
+from functools import wraps
+from pathlib import Path
+from time import perf_counter, time
+from typing import Dict, Optional, Tuple, Union
+from loguru import logger
+
+# Internal imports
+from config import METRICS_ENABLED, METRICS_JSON_LOG, METRICS_PROMETHEUS_FILE
+
+Labels = Tuple[Tuple[str, str], ...]
+_NO_OP = nullcontext()
+
+
+def _key(name: str, labels: dict) -> Tuple[str, Labels]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _series(name: str, labels: Labels) -> str:
+    if not labels:
+        return name
+    pairs = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return f"{name}{{{pairs}}}"
+
+
+class _Stage:
+    def __init__(self, metrics: "Metrics", name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        seconds = perf_counter() - self._start
+        status = "ok" if exc_type is None else "error"
+        self.metrics.observe("stage_seconds", seconds, stage=self.name, **self.labels)
+        self.metrics.inc("stages", stage=self.name, status=status, **self.labels)
+        self.metrics.event(
+            "stage",
+            f"Stage {self.name} {status} in {seconds:.2f}s",
+            stage=self.name,
+            status=status,
+            seconds=round(seconds, 6),
+            **self.labels,
+        )
+        return False
+
+
+class Metrics:
+    """
+    Process-wide counters and summaries (count, sum and max of the observed values),
+    keyed by name and labels. While disabled, every method returns at once, so the
+    instrumented code only pays an attribute check.
+    Events (stage timings, batch latencies) are logged with a "metric" extra field, that
+    a JSON sink of loguru selects, and the totals can be written as a Prometheus textfile.
+    """
+
+    def __init__(
+        self, enabled: bool = METRICS_ENABLED, prefix: str = "data_extraction"
+    ):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.prometheus_file: Optional[Path] = None
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._summaries: Dict[Tuple[str, Labels], list] = {}
+        self._sink_id = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def configure(
+        self,
+        enabled: bool = True,
+        json_log: Union[str, Path, None] = METRICS_JSON_LOG,
+        prometheus_file: Union[str, Path, None] = METRICS_PROMETHEUS_FILE,
+    ) -> None:
+        """
+        :param enabled: Record the metrics
+        :param json_log: File receiving the metric events as JSON lines
+        :param prometheus_file: Textfile rewritten with the totals by flush, and at exit
+        """
+        self.enabled = enabled
+        if self._sink_id is not None:
+            logger.remove(self._sink_id)
+            self._sink_id = None
+        if enabled and json_log:
+            self._sink_id = logger.add(
+                json_log,
+                level="DEBUG",
+                serialize=True,
+                filter=lambda record: "metric" in record["extra"],
+            )
+        self.prometheus_file = Path(prometheus_file) if prometheus_file else None
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = max(summary[2], value)
+
+    def event(self, metric: str, message: str, level: str = "DEBUG", **fields) -> None:
+        # A log line carrying its values as extra fields, for the JSON sink
+        if not self.enabled:
+            return
+        logger.bind(metric=metric, **fields).log(level, message)
+
+    def stage(self, name: str, **labels):
+        """
+        Context manager timing a stage in stage_seconds, and logging it as an event.
+        """
+        if not self.enabled:
+            return _NO_OP
+        return _Stage(self, name, labels)
+
+    def staged(self, name: str):
+        """
+        Decorator running every call of a function as a stage, see stage.
+        """
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def timed(self, name: Optional[str] = None):
+        """
+        Decorator timing every call of a function in call_seconds.
+        """
+
+        def decorator(func):
+            function = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(
+                        "call_seconds", perf_counter() - start, function=function
+                    )
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "summaries": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": count,
+                        "sum": total,
+                        "max": maximum,
+                    }
+                    for (name, labels), (count, total, maximum) in sorted(
+                        self._summaries.items()
+                    )
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        :return: The totals in the Prometheus text exposition format
+        """
+        lines, typed = [], set()
+
+        def declare(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            declare(metric, "counter")
+            lines.append(f"{_series(metric, labels)} {_number(value)}")
+        for (name, labels), (count, total, _) in summaries:
+            metric = f"{self.prefix}_{name}"
+            declare(metric, "summary")
+            lines.append(f"{_series(metric + '_count', labels)} {count}")
+            lines.append(f"{_series(metric + '_sum', labels)} {_number(total)}")
+        for (name, labels), (_, _, maximum) in summaries:
+            metric = f"{self.prefix}_{name}_max"
+            declare(metric, "gauge")
+            lines.append(f"{_series(metric, labels)} {_number(maximum)}")
+        declare(f"{self.prefix}_last_flush_timestamp_seconds", "gauge")
+        lines.append(f"{self.prefix}_last_flush_timestamp_seconds {time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Union[str, Path]) -> None:
+        # Replaced atomically, the textfile collector never reads a partial file
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_file.write_text(self.to_prometheus())
+        os.replace(tmp_file, path)
+
+    def flush(self) -> None:
+        """
+        Log the totals as a JSON event and rewrite the Prometheus textfile.
+        """
+        if not self.enabled:
+            return
+        self.event("snapshot", "Metrics snapshot", **self.snapshot())
+        if self.prometheus_file is not None:
+            self.write_prometheus(self.prometheus_file)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+metrics = Metrics(enabled=False)
+if METRICS_ENABLED:
+    metrics.configure()
@@ -0,0 +1,140 @@
+"""
+Created by Analitika at 18/10/2026
+contact@analitika.fr
+"""
+# External imports
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Union
+from loguru import logger
+
+
+class S3DiskCache:
+    """
+    Read-through disk cache of S3 objects keyed by bucket, key and ETag.
+    Files are written to a temporary name and renamed into place, so several
+    processes can share the same directory. The least recently read objects are
+    evicted once the cache grows over max_bytes.
+    """
+
+    def __init__(self, root: Union[str, Path], max_bytes: int):
+        """
+        :param root: Directory of the cache
+        :param max_bytes: Size cap of the cached objects
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._objects = self.root / "objects"
+        self._keys = self.root / "keys"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._keys.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = sum(path.stat().st_size for path in self._iter_files())
+
+    @staticmethod
+    def _digest(*parts: str) -> str:
+        return hashlib.sha256("/".join(parts).encode("utf-8")).hexdigest()
+
+    def _object_path(self, bucket: str, key: str, etag: str) -> Path:
+        digest = self._digest(bucket, key, etag)
+        return self._objects / digest[:2] / digest
+
+    def _key_path(self, bucket: str, key: str) -> Path:
+        return self._keys / self._digest(bucket, key)
+
+    def _iter_files(self):
+        for directory in self._objects.iterdir():
+            if directory.is_dir():
+                yield from (
+                    p for p in directory.iterdir() if not p.name.endswith(".tmp")
+                )
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def known_etag(self, bucket: str, key: str) -> Optional[str]:
+        """
+        :return: The ETag of the last cached version of an object, if any
+        """
+        try:
+            return self._key_path(bucket, key).read_text()
+        except FileNotFoundError:
+            return None
+
+    def get(self, bucket: str, key: str, etag: str) -> Optional[bytes]:
+        """
+        :return: The cached content of this version of the object, or None on a miss
+        """
+        path = self._object_path(bucket, key, etag)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # the modification time tracks the last read for LRU
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, bucket: str, key: str, etag: str, data: bytes) -> None:
+        """
+        Store a version of an object after a miss, evicting old entries if the cache is full.
+        """
+        self._atomic_write(self._object_path(bucket, key, etag), data)
+        self._atomic_write(self._key_path(bucket, key), etag.encode("utf-8"))
+        with self._lock:
+            self.misses += 1
+            self._size += len(data)
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete the least recently read objects until the cache is under 90% of its cap.
+        The directory is rescanned, so entries written by other processes are counted.
+        """
+        with self._lock:
+            entries = []
+            for path in self._iter_files():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            size = sum(entry[1] for entry in entries)
+            target = 0.9 * self.max_bytes
+            for _, file_size, path in sorted(entries):
+                if size <= target:
+                    break
+                try:
+                    path.unlink()
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+                size -= file_size
+            self._size = size
+        logger.debug(f"S3 cache evicted down to {size} bytes")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self._size,
+            }